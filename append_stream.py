@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import uuid
+import threading
+from pagination import StreamPagination
+
+# 围栏代码块的起止行
+FENCE_PATTERN = re.compile(r' {0,3}(```|~~~)')
+# 列表项：空行之后仍是列表时不在此处分块，保持同一个列表
+LIST_ITEM_PATTERN = re.compile(r'\s*([-*+]|\d+[.)])\s')
+
+def split_blocks(source):
+    """把 Markdown 源码分成已经固定的前半部分和仍可能变化的末尾块
+
+    只在围栏代码块和 $$ 公式之外的空行处分块，并且要等空行之后的一行完整到达、
+    确认不是缩进内容或列表的延续之后才分开。
+    """
+    lines = source.split('\n')
+    in_fence = False
+    in_math = False
+    cut = 0
+    offset = 0
+    blank = False
+    # 最后一个元素是尚未结束的行，不参与判断
+    for line in lines[:-1]:
+        if blank and line.strip() and not line[0].isspace() and not LIST_ITEM_PATTERN.match(line):
+            cut = offset
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        elif not in_fence and line.count('$$') % 2:
+            in_math = not in_math
+        blank = not line.strip() and not in_fence and not in_math
+        offset += len(line) + 1
+    return source[:cut], source[cut:]
+
+def visible_tail(source):
+    """去掉末尾尚未闭合的公式，避免把写到一半的公式交给 LaTeX 渲染"""
+    if source.count('$$') % 2:
+        return source[:source.rindex('$$')]
+    single = source.replace('$$', '')
+    if single.count('$') % 2:
+        return source[:source.rindex('$')]
+    return source
+
+class TextStream:
+    """纯文本追加：只重新折行最后一个段落，文字按原样显示，不解析 HTML"""
+
+    def __init__(self, paginator, lock):
+        self.paginator = paginator
+        self.lock = lock
+        self.pages = paginator.text_pagination([])
+        self.tail = ''
+        self.tail_line = 0
+
+    def append(self, text):
+        """追加文本，返回第一个内容有变化的页号"""
+        paragraphs = (self.tail + text.replace('\r', '')).split('\n')
+        lines = []
+        for paragraph in paragraphs[:-1]:
+            lines.extend(self.paginator.wrap_text(paragraph))
+        tail_line = self.tail_line + len(lines)
+        lines.extend(self.paginator.wrap_text(paragraphs[-1]))
+        first_page = self.tail_line // self.pages.lines_per_page
+        with self.lock:
+            self.pages.lines[self.tail_line:] = lines
+        self.tail = paragraphs[-1]
+        self.tail_line = tail_line
+        return first_page
+
+class MarkdownStream:
+    """Markdown 追加：已经固定的块各自排版一次，每次只重新转换、排版末尾的块
+
+    make_segment 把一段 Markdown 源码转换并排版为独立的文档，文档创建后不再修改。
+    """
+
+    def __init__(self, paginator, lock, make_segment):
+        self.paginator = paginator
+        self.lock = lock
+        self.make_segment = make_segment
+        self.pages = StreamPagination(paginator.page_width, paginator.color)
+        self.tail = ''
+        self.tail_segment = False
+
+    def append(self, text):
+        """追加文本，返回第一个内容有变化的页号"""
+        stable, self.tail = split_blocks(self.tail + text.replace('\r', ''))
+        # 新段在锁外转换和排版，锁内只替换分页结果
+        documents = []
+        if stable:
+            documents.append(self.make_segment(stable))
+        tail = visible_tail(self.tail)
+        if tail.strip():
+            documents.append(self.make_segment(tail))
+        with self.lock:
+            start = len(self.pages.segments) - (1 if self.tail_segment else 0)
+            first_page = self.paginator.replace_segments(self.pages, start, documents)
+        self.tail_segment = bool(tail.strip())
+        return first_page
+
+class StreamSession:
+    """一次追加显示：从第一次追加到被新内容取代为止"""
+
+    def __init__(self, content_type):
+        self.id = uuid.uuid4().hex[:12]
+        self.content_type = content_type
+        self.document = None
+        self.pending = []
+        self.received = 0
+        self.error = None
+        self.created_at = time.time()
+
+    @property
+    def pages(self):
+        return self.document.pages
+
+class StreamRenderer:
+    """在后台线程中增量排版追加的文本
+
+    排版线程忙时到达的多个文本块合并为一次追加；create(content_type) 创建 TextStream
+    或 MarkdownStream，on_updated(session, first_page, seconds, chars) 在排版线程中回调。
+    """
+
+    def __init__(self, create, on_updated):
+        self.create = create
+        self.on_updated = on_updated
+        self.condition = threading.Condition()
+        self.session = None
+        self.stopping = False
+        self.thread = threading.Thread(target=self._worker, name='render-stream', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+    def append(self, text, content_type, seed=None, reset=False):
+        """追加文本，需要开始新的会话时以 seed 为初始内容，返回 StreamSession"""
+        with self.condition:
+            session = self.session
+            if session is None or reset or session.content_type != content_type:
+                session = StreamSession(content_type)
+                if seed:
+                    session.pending.append(seed)
+                    session.received += len(seed)
+                self.session = session
+            session.pending.append(text)
+            session.received += len(text)
+            self.condition.notify()
+            return session
+
+    def current(self):
+        with self.condition:
+            return self.session
+
+    def close(self):
+        """结束当前会话，之后的追加开始新的文档"""
+        with self.condition:
+            self.session = None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.stopping and (self.session is None or not self.session.pending):
+                    self.condition.wait()
+                if self.stopping:
+                    break
+                session = self.session
+                text = ''.join(session.pending)
+                session.pending = []
+            start = time.perf_counter()
+            try:
+                if session.document is None:
+                    session.document = self.create(session.content_type)
+                first_page = session.document.append(text)
+            except Exception as e:
+                session.error = str(e)
+                print(f"追加内容排版失败: {str(e)}")
+                continue
+            self.on_updated(session, first_page, time.perf_counter() - start, len(text))
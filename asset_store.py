@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from functools import partial
+from collections import OrderedDict
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class AssetStore:
+    """内容寻址的图片资源库：原始数据按 sha256 存盘，解码缩放后的画面保存在 LRU 中
+
+    memory 为 MemoryAccountant 时，已解码的画面登记在 assets 类别下，可被统一淘汰。
+    """
+
+    def __init__(self, asset_dir, max_frame_bytes=64 * 1024 * 1024, memory=None):
+        self.asset_dir = asset_dir
+        self.max_frame_bytes = max_frame_bytes
+        self.memory = memory
+        self.frames = OrderedDict()
+        self.frame_bytes = 0
+        self.lock = threading.Lock()
+        self.frame_hits = 0
+        self.frame_misses = 0
+        try:
+            os.makedirs(self.asset_dir, exist_ok=True)
+        except OSError as e:
+            print(f"无法创建资源目录 {self.asset_dir}: {str(e)}")
+
+    @staticmethod
+    def hash_bytes(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_valid_hash(digest):
+        return isinstance(digest, str) and HASH_PATTERN.match(digest) is not None
+
+    def _path(self, digest):
+        return os.path.join(self.asset_dir, digest[:2], digest)
+
+    def has(self, digest):
+        return self.is_valid_hash(digest) and os.path.exists(self._path(digest))
+
+    def check(self, hashes):
+        """批量检查哪些资源已存在"""
+        existing = []
+        missing = []
+        for digest in hashes:
+            (existing if self.has(digest) else missing).append(digest)
+        return {'existing': existing, 'missing': missing}
+
+    def put(self, data, expected_hash=None):
+        """保存资源并返回其哈希；给出的哈希与内容不符时抛出 ValueError"""
+        digest = self.hash_bytes(data)
+        if expected_hash is not None and expected_hash != digest:
+            raise ValueError(f"哈希不匹配: 期望 {expected_hash}，实际 {digest}")
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    def read(self, digest):
+        """读取资源原始数据，不存在时返回 None"""
+        if not self.is_valid_hash(digest):
+            return None
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get_frame(self, digest):
+        """取得已解码的画面（QPixmap），未缓存时返回 None"""
+        with self.lock:
+            frame = self.frames.get(digest)
+            if frame is None:
+                self.frame_misses += 1
+                return None
+            self.frames.move_to_end(digest)
+            self.frame_hits += 1
+        if self.memory is not None:
+            self.memory.touch('assets', digest)
+        return frame
+
+    def put_frame(self, digest, frame):
+        """缓存已解码的画面，超出容量时按最久未使用淘汰"""
+        size = frame.width() * frame.height() * 4
+        evicted_digests = []
+        with self.lock:
+            old = self.frames.pop(digest, None)
+            if old is not None:
+                self.frame_bytes -= old.width() * old.height() * 4
+            self.frames[digest] = frame
+            self.frame_bytes += size
+            while self.frame_bytes > self.max_frame_bytes and len(self.frames) > 1:
+                evicted_digest, evicted = self.frames.popitem(last=False)
+                self.frame_bytes -= evicted.width() * evicted.height() * 4
+                evicted_digests.append(evicted_digest)
+        if self.memory is None:
+            return
+        for evicted_digest in evicted_digests:
+            self.memory.release('assets', evicted_digest)
+        self.memory.charge('assets', digest, size, partial(self._evict_frame, digest, frame))
+        # 记账在锁外进行，期间画面可能已被淘汰
+        with self.lock:
+            stale = self.frames.get(digest) is not frame
+        if stale:
+            self.memory.release('assets', digest)
+
+    def _evict_frame(self, digest, frame):
+        """统一淘汰时回调：缓存中仍是登记时的画面才移除"""
+        with self.lock:
+            if self.frames.get(digest) is frame:
+                del self.frames[digest]
+                self.frame_bytes -= frame.width() * frame.height() * 4
+
+    def stats(self):
+        with self.lock:
+            return {
+                'frames': len(self.frames),
+                'frame_bytes': self.frame_bytes,
+                'max_frame_bytes': self.max_frame_bytes,
+                'frame_hits': self.frame_hits,
+                'frame_misses': self.frame_misses,
+                'asset_dir': self.asset_dir
+            }
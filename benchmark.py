@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+显示渲染流水线基准测试
+
+在无显示器的 Linux 上以 QT_QPA_PLATFORM=offscreen 运行 DisplayWindow，
+分别计时图片解码缩放、LaTeX 公式渲染、Markdown 转换、分页和翻页显示。
+
+用法：
+    python benchmark.py --output results.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+
+# 必须在导入 Qt 之前设置
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('RPI_DISPLAY_FORMULA_CACHE', '')
+os.environ.setdefault('RPI_DISPLAY_ASSET_DIR', os.path.join(tempfile.gettempdir(), 'rpi-display-bench-assets'))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def formula_document():
+    """test_latex.py 中的全部公式，每个公式各有行内和块级两种形式"""
+    from test_latex import SIMPLE_FORMULAS, COMPLEX_FORMULAS, SPECIAL_FORMULAS
+    parts = []
+    for formula in SIMPLE_FORMULAS + COMPLEX_FORMULAS + SPECIAL_FORMULAS:
+        parts.append(f"行内公式: ${formula}$\n\n块级公式:\n$${formula}$$")
+    return '\n\n'.join(parts)
+
+def cjk_markdown(sections=60):
+    """固定内容的长篇中文 Markdown，包含标题、列表、表格和公式"""
+    sentence = '树莓派显示服务把文本、Markdown 和图片投射到竖屏上，长文档需要自动分页并定时翻页。'
+    parts = []
+    for i in range(sections):
+        parts.append(f'## 第 {i + 1} 节')
+        parts.append(sentence * (1 + i % 4))
+        parts.append(f'- 要点一：行内公式 $x_{{{i}}}^2 + y^2 = r^2$\n- 要点二：{sentence}')
+        parts.append('| 项目 | 数值 |\n|---|---|\n| 亮度 | 80 |\n| 对比度 | 50 |')
+        if i % 5 == 0:
+            parts.append(f'$$\\sum_{{k=1}}^{{{i + 1}}} k = \\frac{{n(n+1)}}{{2}}$$')
+    return '\n\n'.join(parts)
+
+def cjk_text(paragraphs=200):
+    sentence = '这是一段用于分页基准测试的纯文本内容，包含中文和 English words 混排。'
+    return '\n'.join(sentence * (1 + i % 5) for i in range(paragraphs))
+
+def load_corpus():
+    with open(os.path.join(BASE_DIR, 'base63.txt')) as f:
+        image = f.read().strip()
+    return {
+        'formulas': formula_document(),
+        'cjk_markdown': cjk_markdown(),
+        'cjk_text': cjk_text(),
+        'image': image
+    }
+
+def summarize(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        'median_ms': round(statistics.median(ms), 3),
+        'min_ms': round(min(ms), 3),
+        'mean_ms': round(statistics.mean(ms), 3),
+        'max_ms': round(max(ms), 3),
+        'runs': len(ms)
+    }
+
+class Benchmark:
+    """在同一个 DisplayWindow 上逐阶段计时"""
+
+    def __init__(self, app, window, corpus, repeat):
+        self.app = app
+        self.window = window
+        self.renderer = window.renderer
+        self.corpus = corpus
+        self.repeat = repeat
+        self.results = {}
+
+    def timeit(self, name, func, setup=None):
+        samples = []
+        for _ in range(self.repeat):
+            arg = setup() if setup else None
+            start = time.perf_counter()
+            func(arg)
+            samples.append(time.perf_counter() - start)
+        self.results[name] = summarize(samples)
+
+    def job(self, content, content_type, html=None, resources=None):
+        from render_pipeline import RenderJob
+        job = RenderJob(content, content_type)
+        job.html = html
+        job.resources = resources
+        return job
+
+    def bench_image(self):
+        image = self.corpus['image']
+        self.timeit('image_decode_scale', self.renderer.decode, lambda: self.job(image, 'image'))
+
+    def bench_latex(self):
+        from formula_cache import FormulaCache
+        formula_renderer = self.renderer.formula_renderer
+        original_cache = formula_renderer.cache
+        for name, key in (('latex_formulas', 'formulas'), ('latex_cjk_markdown', 'cjk_markdown')):
+            content = self.corpus[key]
+
+            def cold_setup():
+                # 每次使用空缓存，测量真正的渲染耗时
+                formula_renderer.cache = FormulaCache(None, original_cache.max_entries)
+                return self.job(content, 'markdown')
+            self.timeit(f'{name}_cold', self.renderer.render_math, cold_setup)
+
+            formula_renderer.cache = FormulaCache(None, original_cache.max_entries)
+            self.renderer.render_math(self.job(content, 'markdown'))
+            self.timeit(f'{name}_warm', self.renderer.render_math, lambda: self.job(content, 'markdown'))
+        formula_renderer.cache = original_cache
+
+    def bench_markdown(self):
+        job = self.job(self.corpus['cjk_markdown'], 'markdown')
+        self.renderer.render_math(job)
+        math_html = job.html
+        self.timeit('markdown2_cjk_markdown', self.renderer.render_markdown,
+                    lambda: self.job(None, 'markdown', math_html))
+        self.markdown_html = self.job(None, 'markdown', math_html, job.resources)
+        self.renderer.render_markdown(self.markdown_html)
+
+    def bench_layout(self):
+        html = self.markdown_html.html
+        resources = self.markdown_html.resources
+        self.timeit('split_content_cjk_markdown', self.renderer.layout, lambda: self.job(None, 'markdown', html, resources))
+        text = self.corpus['cjk_text']
+        self.timeit('split_content_cjk_text', self.renderer.layout, lambda: self.job(text, 'text'))
+
+    def wait_prefetch(self, index, timeout=5.0):
+        deadline = time.time() + timeout
+        while index not in self.window.page_pixmaps and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+
+    def bench_page_show(self):
+        job = self.job(None, 'markdown', self.markdown_html.html)
+        self.renderer.layout(job)
+        window = self.window
+
+        def cold_setup():
+            window.pages = job.pages
+            window.page_generation = window.page_cache.set_pages(job.pages)
+            window.page_pixmaps = {}
+            window.current_page = 0
+        self.timeit('page_show_cold', lambda _: window.show_current_page(), cold_setup)
+
+        def warm_setup():
+            cold_setup()
+            window.show_current_page()
+            self.wait_prefetch(1)
+            window.current_page = 1
+        self.timeit('page_show_prefetched', lambda _: window.show_current_page(), warm_setup)
+        self.results['page_count_cjk_markdown'] = len(job.pages)
+
+    def run(self):
+        self.bench_image()
+        self.bench_latex()
+        self.bench_markdown()
+        self.bench_layout()
+        self.bench_page_show()
+        return self.results
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """与基线比较，返回退化的项目列表"""
+    regressions = []
+    print(f"\n{'项目':<32}{'基线(ms)':>12}{'本次(ms)':>12}{'比例':>8}")
+    for name, base in baseline.get('results', {}).items():
+        current = results.get(name)
+        if not isinstance(base, dict) or not isinstance(current, dict):
+            continue
+        base_ms = base['median_ms']
+        current_ms = current['median_ms']
+        ratio = current_ms / base_ms if base_ms else float('inf')
+        regressed = current_ms > base_ms * (1 + tolerance) and current_ms - base_ms > min_delta_ms
+        mark = '  <-- 退化' if regressed else ''
+        print(f"{name:<32}{base_ms:>12.2f}{current_ms:>12.2f}{ratio:>8.2f}{mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='显示渲染流水线基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数 (默认: 5)')
+    parser.add_argument('--output', help='结果输出的 JSON 文件')
+    parser.add_argument('--baseline', help='用于比较的基线 JSON 文件')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的中位数增幅 (默认: 0.25)')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='低于该毫秒数的差异不视为退化 (默认: 1.0)')
+    args = parser.parse_args()
+
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QT_VERSION_STR
+    app = QApplication(sys.argv)
+
+    # 渲染组件的日志输出不计入结果
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        import display_service
+        window = display_service.DisplayWindow()
+        # 等后台预热结束，预热的耗时不计入结果
+        while not window.warmed_up.is_set():
+            app.processEvents()
+            time.sleep(0.01)
+        corpus = load_corpus()
+        try:
+            results = Benchmark(app, window, corpus, args.repeat).run()
+        finally:
+            window.cleanup()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'formula_workers': display_service.FORMULA_WORKERS,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+
+    for name, value in results.items():
+        if isinstance(value, dict):
+            print(f"{name:<32}中位数 {value['median_ms']:>10.2f} ms   最小 {value['min_ms']:>10.2f} ms")
+        else:
+            print(f"{name:<32}{value}")
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n性能退化: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n未发现性能退化")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import time
+import base64
+from PyQt6.QtGui import QImage, QPainter, QPainterPath, QColor
+from PyQt6.QtCore import Qt, QCoreApplication
+from latex_renderer import unpack_path, PATH_UNITS, FORMULA_DPI, MOVETO, LINETO, CURVE3, CURVE4, CLOSEPOLY
+from pagination import Paginator
+from append_stream import TextStream, MarkdownStream
+from image_ingest import load_screen_image, load_pillow
+
+# 显示屏分辨率及文字区域内边距
+SCREEN_WIDTH = 720
+SCREEN_HEIGHT = 1560
+PAGE_PADDING = 20
+# 显示文字的字体，显示服务和无窗口渲染共用，保证分页结果一致
+FONT_FAMILY = 'Arial'
+FONT_SIZE = 20
+
+# 预热用的内容：覆盖标题、强调、列表、表格、代码块和中英文混排
+WARM_UP_MARKDOWN = '# 标题 Title\n\n**粗体** *斜体* `code`\n\n- 列表\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n```\nprint(1)\n```'
+
+def markdown_html(source):
+    """Markdown 转为 HTML（公式已替换为图片）"""
+    # 第一次转换 Markdown 时才导入
+    import markdown2
+    html = markdown2.markdown(source, extras=['fenced-code-blocks', 'tables', 'break-on-newline'])
+    return f'<div style="text-align: left;">{html}</div>'
+
+def formula_painter_path(codes, coordinates):
+    """由 matplotlib 的顶点类型和坐标构造 QPainterPath"""
+    path = QPainterPath()
+    # 字形轮廓按非零环绕规则填充
+    path.setFillRule(Qt.FillRule.WindingFill)
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        x, y = coordinates[2 * i], coordinates[2 * i + 1]
+        if code == MOVETO:
+            path.moveTo(x, y)
+        elif code == LINETO:
+            path.lineTo(x, y)
+        elif code == CURVE3:
+            path.quadTo(x, y, coordinates[2 * i + 2], coordinates[2 * i + 3])
+            i += 1
+        elif code == CURVE4:
+            path.cubicTo(x, y, coordinates[2 * i + 2], coordinates[2 * i + 3], coordinates[2 * i + 4], coordinates[2 * i + 5])
+            i += 2
+        elif code == CLOSEPOLY:
+            path.closeSubpath()
+        i += 1
+    return path
+
+def formula_image(path_data, fontsize, color):
+    """把公式轮廓按字号栅格化为透明背景的图片"""
+    (x0, y0, x1, y1), codes, coordinates = unpack_path(path_data)
+    scale = fontsize * FORMULA_DPI / 72 / PATH_UNITS
+    image = QImage(max(1, math.ceil((x1 - x0) * scale)), max(1, math.ceil((y1 - y0) * scale)),
+                   QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    # 轮廓的 y 轴向上，翻转为图片坐标
+    painter.scale(scale, -scale)
+    painter.translate(-x0, -y1)
+    painter.fillPath(formula_painter_path(codes, coordinates), QColor(color))
+    painter.end()
+    return image
+
+class ContentRenderer:
+    """渲染流水线各阶段的实现，不依赖任何窗口部件，可在工作线程中运行"""
+
+    def __init__(self, formula_renderer, font, asset_store=None):
+        self.formula_renderer = formula_renderer
+        self.asset_store = asset_store
+        self.font = font
+        self.page_width = SCREEN_WIDTH - PAGE_PADDING * 2
+        self.page_height = SCREEN_HEIGHT - PAGE_PADDING * 2
+        self.paginator = Paginator(font, self.page_width, self.page_height)
+        # 追加显示在自己的线程中排版，使用单独的分页器
+        self.stream_paginator = Paginator(font, self.page_width, self.page_height)
+
+    def warm_up(self):
+        """预热各类内容第一次渲染时才会加载的模块和缓存，返回各项耗时
+
+        先启动公式渲染进程，它们在后台预热的同时加载 Markdown 转换器和字体。
+        """
+        timings = {}
+        self.formula_renderer.start()
+
+        start = time.perf_counter()
+        html = markdown_html(WARM_UP_MARKDOWN)
+        timings['markdown'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # 排版一次中英文混排的文档，加载字体及回退字体
+        self.paginator.paginate_html(html)
+        self.paginator.paginate_text('Ag 中文')
+        timings['fonts'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_pillow()
+        timings['pillow'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.formula_renderer.warm_up()
+        timings['formulas'] = time.perf_counter() - start
+        return timings
+
+    def stages(self):
+        return [
+            ('decoding', self.decode),
+            ('math', self.render_math),
+            ('markdown', self.render_markdown),
+            ('layout', self.layout)
+        ]
+
+    def decode(self, job):
+        """解码并缩放图片"""
+        if job.content_type != 'image':
+            return
+        if job.asset is not None:
+            # 已解码过的资源直接使用缓存画面（只取引用，QPixmap 仍在 GUI 线程中使用）；
+            # 预览任务的画面在 HTTP 线程中编码，需要 QImage，重新解码
+            if not job.preview:
+                job.pixmap = self.asset_store.get_frame(job.asset)
+                if job.pixmap is not None:
+                    return
+            image_data = self.asset_store.read(job.asset)
+            if image_data is None:
+                raise Exception(f"资源不存在: {job.asset}")
+        else:
+            image_data = self.image_bytes(job.content)
+        # 解码后不再保留原始数据
+        job.content = None
+
+        # 直接解码为屏幕尺寸
+        scaled, timings = load_screen_image(image_data, SCREEN_WIDTH, SCREEN_HEIGHT)
+        job.timings.update(timings)
+        print(f"图片解码 {timings['image_decode'] * 1000:.1f}ms，缩放 {timings['image_scale'] * 1000:.1f}ms，尺寸 {scaled.width()}x{scaled.height()}")
+        job.image = self.compose_frame(scaled)
+
+    @staticmethod
+    def image_bytes(content):
+        """取得图片的二进制数据：直接上传的字节原样返回，字符串按 base64 解码"""
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return content
+        # 移除 data:image/jpeg;base64, 前缀
+        if content.startswith('data:image'):
+            content = content[content.index(',') + 1:]
+        return base64.b64decode(content)
+
+    def compose_frame(self, image):
+        """把图片居中合成到黑色整屏画面上"""
+        frame = QImage(SCREEN_WIDTH, SCREEN_HEIGHT, QImage.Format.Format_RGB32)
+        frame.fill(Qt.GlobalColor.black)
+        painter = QPainter(frame)
+        painter.drawImage((SCREEN_WIDTH - image.width()) // 2, (SCREEN_HEIGHT - image.height()) // 2, image)
+        painter.end()
+        return frame
+
+    def render_math(self, job):
+        """将 Markdown 中的 LaTeX 公式渲染为图片"""
+        if job.content_type != 'markdown':
+            return
+        print("开始处理 LaTeX 公式...")
+        result = self.formula_renderer.render_math(job.content, lambda: job.cancelled)
+        if result is None:
+            return
+        job.html, formulas = result
+        job.resources = self.formula_images(formulas)
+        print(f"LaTeX 公式处理完成，缓存统计: {self.formula_renderer.cache.stats()}")
+
+    def formula_images(self, formulas):
+        """按各公式在文档中的字号栅格化，每个公式在文档中只栅格化一次"""
+        images = {}
+        for url, (path_data, fontsize) in formulas.items():
+            try:
+                images[url] = formula_image(path_data, fontsize, self.formula_renderer.color)
+            except Exception as e:
+                print(f"公式图片栅格化失败: {url}: {str(e)}")
+        return images
+
+    def render_markdown(self, job):
+        """将文本或 Markdown 转换为 HTML"""
+        if job.content_type == 'text':
+            # 处理纯文本
+            content = job.content.replace('\n', '<br>')
+            job.html = f'<div style="text-align: left;">{content}</div>'
+        elif job.content_type == 'markdown':
+            job.html = markdown_html(job.html)
+
+    def layout(self, job):
+        """分页"""
+        if job.content_type == 'text':
+            pages = self.paginator.paginate_text(job.content)
+            if pages is not None:
+                job.pages = pages
+                return
+        if job.html is not None:
+            job.pages = self.split_content(job.html, job.resources)
+
+    def split_content(self, content, resources=None):
+        """将 HTML 内容排版一次并分页"""
+        pages = self.paginator.paginate_html(content, resources)
+        self.to_gui_thread(pages.document)
+        return pages
+
+    @staticmethod
+    def to_gui_thread(document):
+        """文档在排版线程中创建，交给 GUI 线程绘制"""
+        app = QCoreApplication.instance()
+        if app is not None:
+            document.moveToThread(app.thread())
+
+    def stream_segment(self, source):
+        """把追加显示的一段 Markdown 转换并排版为独立的文档"""
+        html, formulas = self.formula_renderer.render_math(source)
+        document = self.stream_paginator.new_segment(markdown_html(html), self.formula_images(formulas))
+        self.to_gui_thread(document)
+        return document
+
+    def new_stream(self, content_type, lock):
+        """创建追加显示的文档；lock 为绘制页面时持有的锁，修改分页结果时同样持有"""
+        if content_type == 'text':
+            return TextStream(self.stream_paginator, lock)
+        return MarkdownStream(self.stream_paginator, lock, self.stream_segment)
@@ -1,36 +1,143 @@
 #!/usr/bin/env python3
 import sys
 import os
-import base64
 import json
 import signal
-from io import BytesIO
-from threading import Thread
-from flask import Flask, request, jsonify
+import time
+import queue
+import codecs
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Thread, Lock, Event
+# 先于 Qt 等第三方模块导入，记录解释器启动完成的时刻
+from startup import StartupTimer
 from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QTextEdit, QVBoxLayout, QWidget
-from PyQt6.QtGui import QPixmap, QImage, QFont
+from PyQt6.QtGui import QPixmap, QFont
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject
-import markdown2
-import matplotlib.pyplot as plt
-import re
-# from projector_controller import ProjectorController  # 注释掉投影仪控制器导入
+from formula_cache import FormulaCache
+from latex_renderer import FormulaRenderer
+from content_renderer import ContentRenderer, SCREEN_WIDTH, SCREEN_HEIGHT, PAGE_PADDING, FONT_FAMILY, FONT_SIZE
+from render_pipeline import RenderPipeline, PRIORITIES, DROPPED_STATUSES
+from page_cache import PageCache
+from asset_store import AssetStore
+from metrics import DisplayMetrics
+from playlist import Playlist, PlaylistItem
+from event_bus import EventBus, format_sse
+from screenshot import ScreenshotCache, FORMATS as SCREENSHOT_FORMATS, encode_image
+from headless import preview_frames
+from append_stream import StreamRenderer
+from memory_budget import MemoryAccountant
+from state_snapshot import save_snapshot, Snapshot
+from smooth_scroll import FrameStats, ScrollTiles, ScrollView
+
+# 启动各阶段耗时，见 /startup
+startup = StartupTimer()
+
+# 公式缓存配置
+FORMULA_CACHE_DIR = os.environ.get('RPI_DISPLAY_FORMULA_CACHE', os.path.expanduser('~/.cache/rpi-display/formulas'))
+FORMULA_CACHE_SIZE = int(os.environ.get('RPI_DISPLAY_FORMULA_CACHE_SIZE', '256'))
+FORMULA_COLOR = 'white'
+# 公式渲染进程数，默认保留一个核心给 GUI 线程
+FORMULA_WORKERS = int(os.environ.get('RPI_DISPLAY_FORMULA_WORKERS', max(1, (os.cpu_count() or 1) - 1)))
+# 缓存的整页画面数量（每页约 4.5MB）
+PAGE_CACHE_SIZE = int(os.environ.get('RPI_DISPLAY_PAGE_CACHE_SIZE', '5'))
+# 图片资源库目录及已解码画面的内存上限
+ASSET_DIR = os.environ.get('RPI_DISPLAY_ASSET_DIR', os.path.expanduser('~/.cache/rpi-display/assets'))
+ASSET_CACHE_MB = int(os.environ.get('RPI_DISPLAY_ASSET_CACHE_MB', '64'))
+# HTTP 服务配置：pooled 为固定线程池的服务器，flask 为 Flask 自带的开发服务器
+HTTP_SERVER = os.environ.get('RPI_DISPLAY_HTTP_SERVER', 'pooled')
+HTTP_HOST = os.environ.get('RPI_DISPLAY_HTTP_HOST', '0.0.0.0')
+HTTP_PORT = int(os.environ.get('RPI_DISPLAY_HTTP_PORT', '5000'))
+HTTP_WORKERS = int(os.environ.get('RPI_DISPLAY_HTTP_WORKERS', '4'))
+# 所有线程都忙时最多再排队的连接数，超出后回复 503
+HTTP_MAX_PENDING = int(os.environ.get('RPI_DISPLAY_HTTP_MAX_PENDING', '16'))
+HTTP_READ_TIMEOUT = float(os.environ.get('RPI_DISPLAY_HTTP_TIMEOUT', '10'))
+# 长连接空闲等待下一个请求的秒数，0 表示不保持连接
+HTTP_KEEP_ALIVE = float(os.environ.get('RPI_DISPLAY_HTTP_KEEP_ALIVE', '5'))
+MAX_BODY_MB = int(os.environ.get('RPI_DISPLAY_MAX_BODY_MB', '32'))
+# 等待渲染的任务达到该数量后，新的显示请求回复 429
+RENDER_QUEUE_LIMIT = int(os.environ.get('RPI_DISPLAY_RENDER_QUEUE_LIMIT', '8'))
+RETRY_AFTER = int(os.environ.get('RPI_DISPLAY_RETRY_AFTER', '1'))
+# /render 等待渲染完成的秒数，以及一次返回的页面画面数上限
+RENDER_TIMEOUT = float(os.environ.get('RPI_DISPLAY_RENDER_TIMEOUT', '30'))
+RENDER_MAX_PAGES = int(os.environ.get('RPI_DISPLAY_RENDER_MAX_PAGES', '20'))
+# 新内容到达时丢弃尚未显示的旧任务，以及是否连正在渲染的任务也取消
+COALESCE_UPDATES = os.environ.get('RPI_DISPLAY_COALESCE', '1') != '0'
+CANCEL_RUNNING = os.environ.get('RPI_DISPLAY_CANCEL_RUNNING', '1') != '0'
+# 播放列表：预渲染的后续条目数、保留的已渲染条目数、条目默认停留秒数
+PLAYLIST_LOOKAHEAD = int(os.environ.get('RPI_DISPLAY_PLAYLIST_LOOKAHEAD', '2'))
+PLAYLIST_CACHE_SIZE = int(os.environ.get('RPI_DISPLAY_PLAYLIST_CACHE_SIZE', '8'))
+PLAYLIST_DEFAULT_DURATION = float(os.environ.get('RPI_DISPLAY_PLAYLIST_DURATION', '10'))
+# 同时连接 /events 的客户端上限，每个连接占用一个 HTTP 工作线程
+EVENT_STREAMS = int(os.environ.get('RPI_DISPLAY_EVENT_STREAMS', '2'))
+EVENT_HEARTBEAT = 15
+# 追加显示每秒最多重绘的次数
+STREAM_FPS = float(os.environ.get('RPI_DISPLAY_STREAM_FPS', '10'))
+STREAM_READ_SIZE = 4096
+# 内容、排版结果、页面画面和各类缓存合计的内存预算，超出时按最久未使用淘汰
+MEMORY_BUDGET_MB = int(os.environ.get('RPI_DISPLAY_MEMORY_MB', '256'))
+# 平滑滚动的默认速度（像素/秒）和帧率，帧率为 0 时跟随显示器刷新率
+SCROLL_SPEED = float(os.environ.get('RPI_DISPLAY_SCROLL_SPEED', '60'))
+SCROLL_FPS = float(os.environ.get('RPI_DISPLAY_SCROLL_FPS', '0'))
+SCROLL_MAX_SPEED = 5000
+# 可见区域之后预先画好的图块数
+SCROLL_LOOKAHEAD = 2
+# 状态快照文件，留空则不保存；画面变化后最多每隔多少秒写入一次
+STATE_FILE = os.environ.get('RPI_DISPLAY_STATE_FILE', os.path.expanduser('~/.cache/rpi-display/state.bin'))
+SNAPSHOT_INTERVAL = float(os.environ.get('RPI_DISPLAY_SNAPSHOT_INTERVAL', '10'))
+# 投影仪串口，留空则不控制投影仪
+PROJECTOR_PORT = os.environ.get('RPI_DISPLAY_PROJECTOR_PORT', '')
+# 无新内容多少秒后关闭投影仪
+PROJECTOR_IDLE_TIMEOUT = float(os.environ.get('RPI_DISPLAY_PROJECTOR_IDLE', '30'))
 
 class DisplaySignals(QObject):
     update_content = pyqtSignal(str, str)  # content, content_type
+    job_finished = pyqtSignal(object)  # RenderJob
+    page_ready = pyqtSignal(int, int)  # generation, page index
+    playlist_changed = pyqtSignal()
+    frame_grab = pyqtSignal(object)  # Future
+    stream_updated = pyqtSignal(object, int)  # StreamSession, 第一个有变化的页
+    job_discarded = pyqtSignal(object)  # RenderJob
+    memory_pressure = pyqtSignal()
+    scroll_start = pyqtSignal(float)  # 速度（像素/秒）
+    scroll_stop = pyqtSignal()
     next_page = pyqtSignal()
     prev_page = pyqtSignal()
 
 class DisplayWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, state_file=None):
         super().__init__()
         self.signals = DisplaySignals()
         self.signals.update_content.connect(self.update_content)
         self.signals.next_page.connect(self.next_page)
         self.signals.prev_page.connect(self.prev_page)
+        self.signals.job_finished.connect(self.apply_job)
+        self.signals.page_ready.connect(self.on_page_ready)
+        self.signals.playlist_changed.connect(self.on_playlist_changed)
+        self.signals.frame_grab.connect(self.on_frame_grab)
+        self.signals.stream_updated.connect(self.schedule_stream_paint)
+        self.signals.job_discarded.connect(self.release_job)
+        self.signals.scroll_start.connect(self.set_scroll)
+        self.signals.scroll_stop.connect(self.stop_scroll)
+        
+        # 内存预算：超出时在 GUI 线程中按最久未使用淘汰，QPixmap 只能在 GUI 线程中释放
+        self.memory = MemoryAccountant(MEMORY_BUDGET_MB * 1024 * 1024, self.signals.memory_pressure.emit)
+        self.signals.memory_pressure.connect(self.memory.enforce)
+        # 当前显示的内容 (键, 是否为追加显示)，固定在内存中不被淘汰
+        self.shown_memory = None
         
-        # 注释掉投影仪相关代码
-        # self.projector = ProjectorController()
-        # self.projector.power_off()
+        # 状态推送与截图：画面每次变化版本号加一，同一版本的截图只编码一次
+        self.events = EventBus(max_subscribers=EVENT_STREAMS)
+        self.frame_version = 0
+        self.screenshots = ScreenshotCache(self.grab_frame)
+        
+        # 投影仪控制：命令在串口线程中依次发送，不会阻塞界面
+        self.projector = None
+        if PROJECTOR_PORT:
+            from projector_controller import ProjectorController
+            self.projector = ProjectorController(PROJECTOR_PORT, idle_timeout=PROJECTOR_IDLE_TIMEOUT)
+            self.projector.state_changed.connect(lambda state: self.events.publish('projector', {'state': state}))
+            self.projector.power_off()
         
         # 设置固定分辨率
         self.setFixedSize(720, 1560)
@@ -38,6 +145,8 @@ class DisplayWindow(QMainWindow):
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
         self.layout = QVBoxLayout(self.central_widget)
+        # 页面画面已包含内边距，整屏显示
+        self.layout.setContentsMargins(0, 0, 0, 0)
         
         # 设置背景色为黑色
         self.setStyleSheet("background-color: black;")
@@ -47,8 +156,9 @@ class DisplayWindow(QMainWindow):
         self.content_label.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
         self.content_label.setWordWrap(True)
         # 调整字体大小以适应竖屏显示
-        self.content_label.setFont(QFont("Arial", 20))
-        self.content_label.setStyleSheet("color: white; padding: 20px; text-align: left;")
+        self.content_label.setFont(QFont(FONT_FAMILY, FONT_SIZE))
+        self.content_label.setStyleSheet("color: white; text-align: left;")
+        self.content_label.setContentsMargins(PAGE_PADDING, PAGE_PADDING, PAGE_PADDING, PAGE_PADDING)
         self.layout.addWidget(self.content_label)
         
         # 分页相关变量
@@ -60,7 +170,98 @@ class DisplayWindow(QMainWindow):
         self.page_timer.timeout.connect(self.auto_next_page)
         self.page_interval = 5000  # 5秒
         
+        # 性能指标
+        self.metrics = DisplayMetrics()
+        
+        # 公式渲染缓存
+        self.formula_cache = FormulaCache(FORMULA_CACHE_DIR, FORMULA_CACHE_SIZE, self.memory)
+        # 常驻公式渲染进程池，窗口显示后在后台启动并预热
+        self.formula_renderer = FormulaRenderer(self.formula_cache, FORMULA_COLOR, FORMULA_WORKERS)
+        
+        # 内容寻址的图片资源库
+        self.asset_store = AssetStore(ASSET_DIR, ASSET_CACHE_MB * 1024 * 1024, self.memory)
+        
+        # 渲染流水线：解码、公式、Markdown、分页各在独立线程中进行
+        self.renderer = ContentRenderer(self.formula_renderer, self.content_label.font(), self.asset_store)
+        self.pipeline = RenderPipeline(self.renderer.stages(), self.on_job_finished,
+                                       coalesce=COALESCE_UPDATES, cancel_running=CANCEL_RUNNING)
+        self.pipeline.start()
+        self.metrics.gauge('display_render_queue_depth', '排队中或正在渲染的任务数', self.pipeline.pending)
+        self.metrics.gauge('display_memory_used_bytes', '计入内存预算的字节数', lambda: self.memory.total)
+        
+        # 整页画面缓存，后台预取相邻页
+        self.page_cache = PageCache(SCREEN_WIDTH, SCREEN_HEIGHT, PAGE_PADDING, PAGE_CACHE_SIZE, self.on_page_prefetched, self.memory)
+        self.page_generation = 0
+        self.page_pixmaps = {}
+        
+        # 追加显示：文本在后台线程中增量排版，按帧率限制重绘
+        self.content_lock = Lock()
+        self.last_job = None
+        self.stream_renderer = StreamRenderer(
+            lambda content_type: self.renderer.new_stream(content_type, self.page_cache.draw_lock),
+            self.on_stream_updated)
+        self.stream_renderer.start()
+        self.stream_session = None
+        self.stream_dirty = None
+        self.stream_page_count = 0
+        self.stream_painted = 0.0
+        self.stream_timer = QTimer()
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.stream_timer.timeout.connect(self.paint_stream)
+        
+        # 播放列表：后台预渲染后续条目，到时切换
+        self.playlist = Playlist(self.submit_playlist_item, PLAYLIST_LOOKAHEAD, PLAYLIST_CACHE_SIZE,
+                                 self.signals.job_discarded.emit)
+        self.playlist_timer = QTimer()
+        self.playlist_timer.setSingleShot(True)
+        self.playlist_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.playlist_timer.timeout.connect(self.playlist_next)
+        self.playlist_waiting = False
+        self.playlist_due = None
+        
+        # 平滑滚动：文档分块画好后按经过的时间连续滚动，每帧只贴可见的图块；scroll_speed 为 None 时按页显示
+        self.scroll_speed = None
+        self.scroll_origin = 0.0
+        self.scroll_started = 0.0
+        self.scroll_max = 0
+        self.scroll_stats = FrameStats(on_frame=self.metrics.scroll_frame.observe)
+        self.scroll_view = ScrollView(self.scroll_stats, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.scroll_view.hide()
+        self.layout.addWidget(self.scroll_view)
+        self.scroll_timer = QTimer()
+        self.scroll_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.scroll_timer.timeout.connect(self.scroll_frame)
+        
+        # 状态快照：画面变化后在写入线程中保存当前内容、页号和画面，重启时先恢复上次的画面
+        self.state_file = state_file or None
+        self.snapshot_version = 0
+        self.snapshot_saved = 0.0
+        self.snapshot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+        self.snapshot_timer = QTimer()
+        self.snapshot_timer.setSingleShot(True)
+        self.snapshot_timer.timeout.connect(self.save_state)
+        
         self.showFullScreen()
+        startup.mark('window_created')
+        # 事件循环开始运行、窗口画出来之后再预热，不拖慢第一帧
+        self.warmed_up = Event()
+        QTimer.singleShot(0, self.on_shown)
+    
+    def on_shown(self):
+        startup.mark('window_shown')
+        Thread(target=self.warm_up, name='warm-up', daemon=True).start()
+    
+    def warm_up(self):
+        """后台预热：启动公式渲染进程，加载 Markdown 转换器、字体和 Pillow"""
+        try:
+            for name, seconds in self.renderer.warm_up().items():
+                startup.record_warm_up(name, seconds)
+        except Exception as e:
+            print(f"预热失败: {str(e)}")
+        startup.mark('warm_up')
+        self.warmed_up.set()
+        print(f"预热完成: {startup.report()['warm_up']}")
     
     def cleanup(self):
         """清理资源"""
@@ -68,171 +269,487 @@ class DisplayWindow(QMainWindow):
         # 停止分页计时器
         if hasattr(self, 'page_timer'):
             self.page_timer.stop()
-        # 注释掉投影仪相关清理代码
-        # if hasattr(self, 'projector') and hasattr(self.projector, 'power_off_timer'):
-        #     self.projector.power_off_timer.stop()
-        # if hasattr(self, 'projector') and hasattr(self.projector, 'serial') and self.projector.serial:
-        #     try:
-        #         self.projector.serial.close()
-        #     except:
-        #         pass
+        if hasattr(self, 'playlist_timer'):
+            self.playlist_timer.stop()
+        if hasattr(self, 'stream_timer'):
+            self.stream_timer.stop()
+        if hasattr(self, 'scroll_timer'):
+            self.scroll_timer.stop()
+            if self.scroll_view.tiles is not None:
+                self.scroll_view.tiles.shutdown()
+        # 退出前保存最新的状态，并等待写入完成
+        if hasattr(self, 'snapshot_timer'):
+            self.snapshot_timer.stop()
+            self.save_state()
+            self.snapshot_writer.shutdown(wait=True)
+        # 停止追加显示的排版线程
+        if hasattr(self, 'stream_renderer'):
+            self.stream_renderer.stop()
+        # 停止渲染流水线
+        if hasattr(self, 'pipeline'):
+            self.pipeline.stop()
+        # 停止页面预取
+        if hasattr(self, 'page_cache'):
+            self.page_cache.shutdown()
+        # 关闭公式渲染进程池
+        if hasattr(self, 'formula_renderer'):
+            self.formula_renderer.shutdown()
+        # 停止投影仪串口线程
+        if getattr(self, 'projector', None) is not None:
+            self.projector.shutdown()
         print("资源清理完成")
     
-    def split_content(self, content):
-        """将内容分页"""
-        # 获取屏幕高度
-        screen_height = self.height() - 40  # 减去padding
-        test_label = QLabel()
-        test_label.setFont(self.content_label.font())
-        test_label.setWordWrap(True)
-        test_label.setFixedWidth(self.width() - 40)  # 减去padding
-        
-        pages = []
-        current_page = []
-        current_height = 0
-        
-        # 按行分割内容
-        lines = content.split('\n')
-        
-        for line in lines:
-            test_label.setText('\n'.join(current_page + [line]))
-            new_height = test_label.sizeHint().height()
-            
-            if current_height > 0 and new_height > screen_height:
-                # 当前页已满，保存当前页并开始新页
-                pages.append('\n'.join(current_page))
-                current_page = [line]
-                current_height = test_label.setText(line)
-                current_height = test_label.sizeHint().height()
+    def take_over_display(self):
+        """直接显示内容前：唤醒投影仪，结束正在轮播的播放列表"""
+        if self.projector is not None:
+            self.projector.power_on()
+            self.projector.update_last_activity()
+        if not self.playlist.is_empty():
+            self.playlist.clear()
+            self.signals.playlist_changed.emit()
+    
+    def update_content(self, content, content_type, asset=None, priority='normal'):
+        """提交渲染任务，立即返回 RenderJob，渲染完成后在 GUI 线程中显示"""
+        self.take_over_display()
+        self.metrics.requests.inc(content_type)
+        with self.content_lock:
+            # 新内容结束正在进行的追加显示
+            self.stream_renderer.close()
+            job = self.pipeline.submit(content, content_type, asset, priority)
+            self.last_job = job
+        return job
+    
+    def append_content(self, text, content_type, reset=False):
+        """追加文本到当前文档，立即返回 StreamSession；排版在后台线程中进行"""
+        self.take_over_display()
+        self.metrics.stream_chars.inc(content_type, amount=len(text))
+        with self.content_lock:
+            seed = None
+            current = self.stream_renderer.current()
+            if current is None or reset or current.content_type != content_type:
+                job = self.last_job
+                if not reset and job is not None and job.content_type == content_type and job.status != 'failed':
+                    # 接着最近一次 /display 的文档追加，还没显示的渲染任务由追加显示接管
+                    seed = job.content
+                    job.cancelled = True
+                self.last_job = None
+            return self.stream_renderer.append(text, content_type, seed, reset)
+    
+    def preview_content(self, content, content_type, asset=None, priority='low'):
+        """提交只渲染不显示的预览任务，立即返回 RenderJob；不影响屏幕上的内容和正在进行的追加显示"""
+        return self.pipeline.submit(content, content_type, asset, priority, preview=True)
+    
+    def on_job_finished(self, job):
+        """渲染线程回调，通过信号把结果交回 GUI 线程"""
+        self.metrics.observe_job(job)
+        self.events.publish('render', {
+            'job_id': job.id,
+            'type': job.content_type,
+            'status': job.status,
+            'error': job.error,
+            'prerender': job.prerender,
+            'preview': job.preview,
+            'timings': {name: round(seconds * 1000, 2) for name, seconds in job.timings.items()}
+        })
+        if job.preview:
+            # 预览结果由等待它的 HTTP 线程取用后释放，不显示也不计入内存预算；等待超时的直接释放
+            if job.status in DROPPED_STATUSES:
+                job.release()
+            return
+        if job.status in DROPPED_STATUSES:
+            print(f"渲染任务 {job.id} 已被新内容取代 ({job.status})")
+            self.signals.job_discarded.emit(job)
+            return
+        if job.prerender and job.pages is not None:
+            # 预渲染的条目顺便画好第一页，切换时直接贴图
+            job.first_frame = self.page_cache.render(job.pages, 0)
+        # 交给 GUI 线程处理之前不能被淘汰
+        self.charge_job(job, pinned=True)
+        self.signals.job_finished.emit(job)
+    
+    def charge_job(self, job, pinned=False):
+        self.memory.charge('content', job.id, job.memory_size(), lambda: self.evict_job(job), pinned)
+    
+    def evict_job(self, job):
+        """内存预算不足时淘汰已显示过或预渲染的任务结果，在 GUI 线程中调用"""
+        if job.prerender:
+            self.playlist.forget(job)
+        job.release()
+    
+    def release_job(self, job):
+        """任务结果不再使用（被取代或被播放列表丢弃），正在显示的除外"""
+        if self.shown_memory == (job.id, False):
+            return
+        self.memory.release('content', job.id)
+        job.release()
+    
+    def hold_shown(self, key, stream=False):
+        """当前显示的内容固定在内存中；之前显示的任务改为可以淘汰，之前的追加显示文档已不再使用，直接注销"""
+        shown = (key, stream)
+        if self.shown_memory is not None and self.shown_memory != shown:
+            old_key, old_stream = self.shown_memory
+            if old_stream:
+                self.memory.release('content', old_key)
             else:
-                current_page.append(line)
-                current_height = new_height
+                self.memory.pin('content', old_key, False)
+        self.shown_memory = shown
+        if not stream:
+            self.memory.pin('content', key)
+    
+    def charge_page_pixmaps(self):
+        """当前页及相邻页的 QPixmap 翻页时要用，只记账不淘汰"""
+        size = sum(pixmap.width() * pixmap.height() * 4 for pixmap in self.page_pixmaps.values())
+        self.memory.charge('pixmaps', 'pages', size)
+    
+    def apply_job(self, job):
+        """在 GUI 线程中换上已渲染好的内容"""
+        if job.prerender:
+            self.on_playlist_job(job)
+            return
+        if job.cancelled:
+            # 渲染完成后、显示之前被追加显示接管
+            job.status = 'superseded'
+            self.release_job(job)
+            return
+        self.show_job(job)
+        if job.status != 'failed':
+            job.status = 'shown'
+        job.shown_at = time.time()
+        self.metrics.end_to_end.observe(job.shown_at - job.created_at, job.content_type)
+    
+    def show_job(self, job):
+        """把渲染结果显示到屏幕上"""
+        self.current_content = job.content
+        self.current_type = job.content_type
+        self.mark_first_frame()
+        self.stream_session = None
+        self.stream_timer.stop()
+        self.hold_shown(job.id)
+        self.end_scroll_view()
         
-        # 添加最后一页
-        if current_page:
-            pages.append('\n'.join(current_page))
+        if job.status == 'failed':
+            if job.content_type == "image":
+                error_msg = f"图片显示错误: {job.error}"
+            else:
+                error_msg = f"Markdown渲染错误: {job.error}"
+            print(error_msg)
+            self.content_label.setContentsMargins(PAGE_PADDING, PAGE_PADDING, PAGE_PADDING, PAGE_PADDING)
+            self.content_label.setText(error_msg)
+            self.frame_changed()
+            self.pages = []
+            self.page_pixmaps = {}
+            self.page_timer.stop()
+        elif job.content_type == "image":
+            # 图片已在解码线程中居中合成为整屏画面
+            pixmap = job.pixmap
+            if pixmap is None:
+                pixmap = QPixmap.fromImage(job.image)
+                # 转换后只保留 QPixmap，播放列表再次显示时直接使用
+                job.pixmap = pixmap
+                job.image = None
+                if job.asset is not None:
+                    self.asset_store.put_frame(job.asset, pixmap)
+                self.charge_job(job, pinned=True)
+            self.content_label.setContentsMargins(0, 0, 0, 0)
+            self.content_label.setPixmap(pixmap)
+            self.frame_changed()
+            print("图片显示成功")
+            self.pages = []
+            self.page_pixmaps = {}
+            self.page_timer.stop()
+        else:
+            # 分页显示
+            self.content_label.setContentsMargins(0, 0, 0, 0)
+            self.pages = job.pages
+            self.page_generation = self.page_cache.set_pages(job.pages, job.first_frame)
+            self.page_pixmaps = {}
+            self.current_page = max(0, min(job.start_page, len(self.pages) - 1))
+            if self.scroll_speed is not None:
+                # 滚动模式下新的文档从当前页开始滚动
+                self.start_scroll_view(self.pages.page_top(self.current_page))
+            else:
+                self.show_current_page()
+                # 如果有多页，启动自动翻页计时器
+                if len(self.pages) > 1:
+                    self.page_timer.start(self.page_interval)
+                else:
+                    self.page_timer.stop()
+        self.charge_page_pixmaps()
         
-        return pages
+        self.events.publish('content', {
+            'job_id': job.id,
+            'type': job.content_type,
+            'status': 'failed' if job.status == 'failed' else 'shown',
+            'pages': len(self.pages),
+            'source': 'playlist' if job.prerender else 'display',
+            'frame': self.frame_version
+        })
     
-    def update_content(self, content, content_type):
-        # 注释掉投影仪相关代码
-        # self.projector.power_on()
-        # self.projector.update_last_activity()
+    def mark_first_frame(self):
+        if startup.mark('first_frame'):
+            print(f"启动耗时: {startup.summary()}")
+    
+    def grab_frame(self):
+        """在 HTTP 线程中调用：请 GUI 线程取出当前画面，返回 (版本号, QImage)"""
+        future = Future()
+        self.signals.frame_grab.emit(future)
+        return future.result(timeout=2)
+    
+    def on_frame_grab(self, future):
+        future.set_result((self.frame_version, self.current_frame()))
+    
+    def current_frame(self):
+        """在 GUI 线程中取出当前画面的 QImage"""
+        if self.scroll_view.tiles is not None:
+            return self.scroll_view.frame()
+        pixmap = self.content_label.pixmap()
+        if pixmap is not None and not pixmap.isNull() and not self.content_label.text():
+            return pixmap.toImage()
+        # 错误提示等文字内容直接截取控件
+        return self.content_label.grab().toImage()
+    
+    def frame_changed(self):
+        """画面已变化：版本号加一，按最小间隔安排保存状态快照"""
+        self.frame_version += 1
+        if self.state_file is not None and not self.snapshot_timer.isActive():
+            delay = self.snapshot_saved + SNAPSHOT_INTERVAL - time.monotonic()
+            self.snapshot_timer.start(max(0, round(delay * 1000)))
+    
+    def save_state(self):
+        """取出当前内容、页号和画面，交给写入线程保存；画面没有变化时不写"""
+        if self.state_file is None or self.snapshot_version == self.frame_version:
+            return
+        self.snapshot_version = self.frame_version
+        self.snapshot_saved = time.monotonic()
+        meta = {
+            'type': self.current_type,
+            'page': self.current_page,
+            'pages': len(self.pages),
+            'frame': self.frame_version,
+            'saved_at': time.time()
+        }
+        # 图片和追加显示只保存画面，文本和 Markdown 同时保存原文，恢复后重新排版以便翻页
+        content = self.current_content if self.current_type in ('text', 'markdown') else None
+        self.snapshot_writer.submit(self.write_state, meta, content, self.current_frame())
+    
+    def write_state(self, meta, content, frame):
+        start = time.perf_counter()
+        try:
+            save_snapshot(self.state_file, meta, content, frame)
+        except Exception as e:
+            print(f"保存状态快照失败: {str(e)}")
+            return
+        self.metrics.snapshot_write.observe(time.perf_counter() - start)
+    
+    def restore_state(self):
+        """启动时直接显示上次保存的画面，文本和 Markdown 在后台重新渲染后回到原来的页
+
+        画面数据映射到内存后只复制一次。没有可用的快照时返回 False。
+        """
+        if self.state_file is None or not os.path.exists(self.state_file):
+            return False
+        try:
+            snapshot = Snapshot(self.state_file)
+        except Exception as e:
+            print(f"读取状态快照失败: {str(e)}")
+            return False
+        try:
+            meta = snapshot.meta
+            if (meta['width'], meta['height']) != (SCREEN_WIDTH, SCREEN_HEIGHT):
+                print(f"状态快照的分辨率 {meta['width']}x{meta['height']} 与屏幕不符，不恢复")
+                return False
+            # QPixmap 可能直接共用 QImage 的数据，先复制一份再关闭映射
+            pixmap = QPixmap.fromImage(snapshot.frame().copy())
+            content = snapshot.content
+        except Exception as e:
+            print(f"读取状态快照失败: {str(e)}")
+            return False
+        finally:
+            snapshot.close()
         
+        self.current_type = meta.get('type') or ''
         self.current_content = content
-        self.current_type = content_type
-        
-        if content_type == "image":
-            try:
-                # 移除 data:image/jpeg;base64, 前缀
-                if content.startswith('data:image'):
-                    content = content.split(',', 1)[1]
-                    
-                image_data = base64.b64decode(content)
-                image = QImage.fromData(image_data)
-                if image.isNull():
-                    raise Exception("无法从数据创建QImage")
-                    
-                pixmap = QPixmap.fromImage(image)
-                if pixmap.isNull():
-                    raise Exception("无法从QImage创建QPixmap")
-                
-                # 使用固定的显示屏分辨率
-                scaled_pixmap = pixmap.scaled(
-                    720, 1560,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                
-                # 计算居中显示的位置
-                x_offset = (720 - scaled_pixmap.width()) // 2
-                y_offset = (1560 - scaled_pixmap.height()) // 2
-                
-                self.content_label.setPixmap(scaled_pixmap)
-                self.content_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.content_label.setContentsMargins(x_offset, y_offset, x_offset, y_offset)
-                print("图片显示成功")
-            except Exception as e:
-                error_msg = f"图片显示错误: {str(e)}"
-                print(error_msg)
-                self.content_label.setText(error_msg)
+        self.content_label.setContentsMargins(0, 0, 0, 0)
+        self.content_label.setPixmap(pixmap)
+        self.frame_changed()
+        # 恢复的画面与快照相同，不必再写
+        self.snapshot_version = self.frame_version
+        startup.mark('restored')
+        self.mark_first_frame()
+        if self.current_type in ('text', 'markdown') and content:
+            with self.content_lock:
+                job = self.pipeline.submit(content, self.current_type)
+                # 渲染完成前在 GUI 线程中设置，apply_job 一定在此之后运行
+                job.start_page = meta.get('page', 0)
+                self.last_job = job
+        print(f"已恢复上次的画面（{self.current_type or '无内容'}，第 {meta.get('page', 0) + 1} 页）")
+        return True
+    
+    def submit_playlist_item(self, item):
+        """以低优先级预渲染播放列表条目"""
+        return self.pipeline.submit(item.content, item.content_type, item.asset, 'low', prerender=True)
+    
+    def set_playlist(self, items, loop=True):
+        """更新播放列表，返回变更统计"""
+        if items:
+            with self.content_lock:
+                self.stream_renderer.close()
+                self.last_job = None
+        changes = self.playlist.replace(items, loop)
+        self.signals.playlist_changed.emit()
+        return changes
+    
+    def on_playlist_changed(self):
+        """播放列表变化后，当前条目已被移除或轮播已停止时切换到下一个条目"""
+        if self.playlist.is_empty():
+            self.playlist_timer.stop()
+            self.playlist_waiting = False
+            self.playlist_due = None
+            return
+        if self.playlist.current() is None or not (self.playlist_timer.isActive() or self.playlist_waiting):
+            self.playlist_due = None
+            self.playlist_next()
+    
+    def playlist_next(self):
+        """切换到播放列表的下一个条目；条目还没渲染好时等渲染完成后立即显示"""
+        result = self.playlist.advance()
+        if result is None:
+            self.playlist_waiting = False
+            self.playlist_due = None
+            return
+        item, job = result
+        if job is None:
+            print(f"播放列表条目 {item.key} 尚未渲染完成，等待中")
+            self.playlist_waiting = True
+            self.playlist_due = None
+            return
+        self.show_playlist_item(item, job)
+    
+    def show_playlist_item(self, item, job):
+        # 按计划的切换时刻累加停留时间，切换本身的耗时不会逐条累积成漂移
+        start = self.playlist_due if self.playlist_due is not None else time.monotonic()
+        self.playlist_waiting = False
+        self.show_job(job)
+        job.shown_at = time.time()
+        self.events.publish('playlist', {'index': self.playlist.index, 'key': item.key, 'duration': item.duration})
+        self.playlist_due = start + item.duration
+        self.playlist_timer.start(max(0, round((self.playlist_due - time.monotonic()) * 1000)))
+    
+    def on_playlist_job(self, job):
+        """播放列表条目预渲染完成"""
+        key = self.playlist.job_done(job)
+        if key is None:
+            # 条目已从播放列表中移除
+            self.release_job(job)
+            return
+        self.memory.pin('content', job.id, False)
+        if not self.playlist_waiting:
+            return
+        item = self.playlist.current()
+        if item is not None and item.key == key:
+            self.show_playlist_item(item, job)
+    
+    def on_stream_updated(self, session, first_page, seconds, chars):
+        """排版线程回调，通过信号交回 GUI 线程"""
+        self.metrics.stream_update.observe(seconds, session.content_type)
+        self.signals.stream_updated.emit(session, first_page)
+    
+    def schedule_stream_paint(self, session, first_page):
+        """记下有变化的页，按帧率合并重绘"""
+        if session is not self.stream_renderer.current():
+            return
+        if session is not self.stream_session:
+            self.stream_session = session
+            self.stream_dirty = first_page
+        elif self.stream_dirty is None or first_page < self.stream_dirty:
+            self.stream_dirty = first_page
+        if not self.stream_timer.isActive():
+            delay = self.stream_painted + 1 / STREAM_FPS - time.monotonic()
+            self.stream_timer.start(max(0, round(delay * 1000)))
+    
+    def paint_stream(self):
+        """重绘追加显示中有变化的页，只作废变化处之后的页面画面"""
+        session = self.stream_session
+        if session is None or session is not self.stream_renderer.current() or self.stream_dirty is None:
+            return
+        first_page, self.stream_dirty = self.stream_dirty, None
+        pages = session.pages
+        if self.pages is not pages:
+            # 第一次重绘，替换当前显示的内容；追加显示总是按页显示
+            self.mark_first_frame()
+            self.hold_shown(session.id, stream=True)
+            self.end_scroll_view()
+            self.current_content = None
+            self.current_type = session.content_type
+            self.content_label.setContentsMargins(0, 0, 0, 0)
+            self.pages = pages
+            self.page_generation = self.page_cache.set_pages(pages)
+            self.page_pixmaps = {}
+            self.page_timer.stop()
+            follow = True
         else:
-            # 处理文本或Markdown内容
-            if content_type == "text":
-                # 处理纯文本
-                content = content.replace('\n', '<br>')
-                processed_content = f'<div style="text-align: left;">{content}</div>'
-            elif content_type == "markdown":
-                # 处理Markdown
-                try:
-                    def latex_to_image(match, is_block=False):
-                        latex = match.group(1)
-                        before_newline = match.string[max(0, match.start() - 2):match.start()].endswith('\n')
-                        after_newline = match.string[match.end():min(len(match.string), match.end() + 2)].startswith('\n')
-                        should_center = before_newline and after_newline
-                        
-                        print(f"正在渲染{'块级' if should_center else '行内'}公式: {latex}")
-                        try:
-                            if should_center:
-                                plt.figure(figsize=(2, 1), facecolor='none')
-                                fontsize = 24
-                                scale_width, scale_height = 200, 100
-                            else:
-                                plt.figure(figsize=(1, 0.5), facecolor='none')
-                                fontsize = 20
-                                scale_width, scale_height = 100, 50
-                                
-                            plt.text(0.5, 0.5, f'${latex}$', fontsize=fontsize, ha='center', va='center', color='white')
-                            plt.axis('off')
-                            
-                            buf = BytesIO()
-                            plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0, transparent=True)
-                            plt.close()
-                            buf.seek(0)
-                            image = QImage.fromData(buf.getvalue())
-                            pixmap = QPixmap.fromImage(image)
-                            
-                            scaled_pixmap = pixmap.scaled(scale_width, scale_height, Qt.AspectRatioMode.KeepAspectRatio)
-                            print(f"公式渲染成功: {latex}")
-                            
-                            if should_center:
-                                return f'<div style="text-align: center; margin: 10px 0;"><img src="data:image/png;base64,{base64.b64encode(buf.getvalue()).decode()}" style="background-color: transparent;" /></div>'
-                            else:
-                                return f'<img src="data:image/png;base64,{base64.b64encode(buf.getvalue()).decode()}" style="background-color: transparent; vertical-align: middle;" />'
-                                
-                        except Exception as e:
-                            print(f"公式渲染失败: {latex}, 错误: {str(e)}")
-                            return f'<div class="math">Error: {latex}</div>'
-                    
-                    print("开始处理 LaTeX 公式...")
-                    content = re.sub(r'\$\$(.*?)\$\$', lambda m: latex_to_image(m, True), content)
-                    content = re.sub(r'\$(.*?)\$', lambda m: latex_to_image(m, False), content)
-                    print("LaTeX 公式处理完成")
-                    
-                    processed_content = markdown2.markdown(content, extras=['fenced-code-blocks', 'tables', 'break-on-newline'])
-                    processed_content = f'<div style="text-align: left;">{processed_content}</div>'
-                except Exception as e:
-                    processed_content = f"Markdown渲染错误: {str(e)}"
-            
-            # 分页显示
-            self.pages = self.split_content(processed_content)
-            self.current_page = 0
+            # 正在看最后一页时跟随新内容，手动翻回前面时停留在原处
+            follow = self.current_page >= self.stream_page_count - 1
+            self.page_generation = self.page_cache.invalidate(first_page)
+            for index in [i for i in self.page_pixmaps if i >= first_page]:
+                del self.page_pixmaps[index]
+        page_count = len(pages)
+        self.stream_page_count = page_count
+        self.stream_painted = time.monotonic()
+        if follow:
+            self.current_page = page_count - 1
+        self.current_page = min(self.current_page, page_count - 1)
+        if follow or self.current_page >= first_page:
             self.show_current_page()
-            
-            # 如果有多页，启动自动翻页计时器
-            if len(self.pages) > 1:
-                self.page_timer.start(self.page_interval)
-            else:
-                self.page_timer.stop()
+        self.memory.charge('content', session.id, pages.memory_size(), pinned=True)
+        self.charge_page_pixmaps()
+        self.events.publish('append', {
+            'stream': session.id,
+            'type': session.content_type,
+            'length': session.received,
+            'pages': page_count,
+            'frame': self.frame_version
+        })
+    
+    def on_page_prefetched(self, generation, index):
+        """预取线程回调，通过信号交回 GUI 线程"""
+        self.signals.page_ready.emit(generation, index)
+    
+    def on_page_ready(self, generation, index):
+        """预取完成后提前转换为 QPixmap，翻页时直接贴图"""
+        if generation != self.page_generation or index in self.page_pixmaps:
+            return
+        if abs(index - self.current_page) <= 1:
+            self.page_pixmaps[index] = QPixmap.fromImage(self.page_cache.get(index))
+            self.charge_page_pixmaps()
     
     def show_current_page(self):
         """显示当前页"""
         if 0 <= self.current_page < len(self.pages):
-            self.content_label.setText(self.pages[self.current_page])
+            start = time.perf_counter()
+            pixmap = self.page_pixmaps.get(self.current_page)
+            source = 'prefetched'
+            if pixmap is None:
+                source = 'rendered'
+                pixmap = QPixmap.fromImage(self.page_cache.get(self.current_page))
+                self.page_pixmaps[self.current_page] = pixmap
+            self.content_label.setPixmap(pixmap)
+            self.frame_changed()
+            self.metrics.page_flip.observe(time.perf_counter() - start, source)
+            self.events.publish('page', {'page': self.current_page, 'pages': len(self.pages), 'frame': self.frame_version})
+            # 只保留当前页及相邻页的 QPixmap
+            for index in list(self.page_pixmaps):
+                if abs(index - self.current_page) > 1:
+                    del self.page_pixmaps[index]
+            self.charge_page_pixmaps()
+            self.page_cache.prefetch(self.current_page)
             print(f"显示第 {self.current_page + 1} 页，共 {len(self.pages)} 页")
     
     def next_page(self):
         """显示下一页"""
+        if self.scroll_view.tiles is not None:
+            self.scroll_jump(1)
+            return
         if self.current_page < len(self.pages) - 1:
             self.current_page += 1
             self.show_current_page()
@@ -242,6 +759,9 @@ class DisplayWindow(QMainWindow):
     
     def prev_page(self):
         """显示上一页"""
+        if self.scroll_view.tiles is not None:
+            self.scroll_jump(-1)
+            return
         if self.current_page > 0:
             self.current_page -= 1
             self.show_current_page()
@@ -256,6 +776,134 @@ class DisplayWindow(QMainWindow):
         else:
             # 最后一页显示完后停止计时器
             self.page_timer.stop()
+    
+    def set_scroll(self, speed):
+        """进入滚动模式或修改滚动速度；正在按页显示文档时从当前页开始滚动，之后显示的文档也都滚动显示"""
+        if self.scroll_view.tiles is not None:
+            # 从当前位置按新速度继续，已滚到末尾时不再移动
+            self.scroll_origin = self.scroll_position()
+            self.scroll_started = time.monotonic()
+            self.scroll_speed = speed
+            if self.scroll_origin < self.scroll_max:
+                self.scroll_timer.start()
+            self.publish_scroll('speed')
+            return
+        self.scroll_speed = speed
+        if self.pages and self.stream_session is None:
+            self.start_scroll_view(self.pages.page_top(self.current_page))
+    
+    def stop_scroll(self):
+        """退出滚动模式，回到滚动位置所在的页并恢复按页显示"""
+        self.scroll_speed = None
+        if self.scroll_view.tiles is None:
+            return
+        self.current_page = self.scroll_page()
+        self.end_scroll_view()
+        self.publish_scroll('stopped')
+        self.show_current_page()
+        if len(self.pages) > 1:
+            self.page_timer.start(self.page_interval)
+    
+    def start_scroll_view(self, offset=0.0):
+        """把当前文档分块渲染，换成滚动显示；offset 为文档中开始滚动的位置"""
+        self.end_scroll_view()
+        tiles = ScrollTiles(self.pages, SCREEN_WIDTH, PAGE_PADDING, self.page_cache.draw_lock, self.page_cache.executor)
+        self.scroll_max = max(0, tiles.height - SCREEN_HEIGHT)
+        self.scroll_origin = min(float(offset), self.scroll_max)
+        self.scroll_started = time.monotonic()
+        self.scroll_view.tiles = tiles
+        self.scroll_view.offset = int(self.scroll_origin)
+        first, last = self.scroll_view.visible_tiles()
+        tiles.prefetch(first, last + SCROLL_LOOKAHEAD)
+        self.page_timer.stop()
+        self.content_label.hide()
+        self.scroll_view.show()
+        
+        # 定时器只负责唤醒，位置由经过的时间决定，帧间隔抖动或掉帧都不会让滚动变慢
+        fps = SCROLL_FPS or self.screen().refreshRate() or 60
+        self.scroll_stats.reset(1 / fps)
+        self.scroll_timer.start(max(1, int(1000 / fps)))
+        self.frame_changed()
+        self.publish_scroll('started')
+    
+    def end_scroll_view(self):
+        """离开滚动显示，释放图块；滚动模式本身不变"""
+        tiles = self.scroll_view.tiles
+        if tiles is None:
+            return
+        self.scroll_timer.stop()
+        self.scroll_view.tiles = None
+        tiles.shutdown()
+        self.scroll_view.hide()
+        self.content_label.show()
+        self.memory.release('pixmaps', 'scroll')
+    
+    def scroll_position(self):
+        elapsed = time.monotonic() - self.scroll_started
+        return max(0.0, min(float(self.scroll_max), self.scroll_origin + self.scroll_speed * elapsed))
+    
+    def scroll_page(self):
+        """屏幕顶部的内容所在的页"""
+        return self.pages.page_at(max(0, self.scroll_view.offset - PAGE_PADDING))
+    
+    def scroll_jump(self, direction):
+        """滚动显示中手动翻页：前后移动一屏文字的高度后继续滚动"""
+        self.scroll_origin = max(0.0, min(float(self.scroll_max),
+                                          self.scroll_position() + direction * (SCREEN_HEIGHT - 2 * PAGE_PADDING)))
+        self.scroll_started = time.monotonic()
+        self.scroll_timer.start()
+        self.scroll_frame()
+    
+    def scroll_frame(self):
+        """每次刷新：按经过的时间算出位置，预取前方的图块，重绘可见区域"""
+        tiles = self.scroll_view.tiles
+        if tiles is None:
+            self.scroll_timer.stop()
+            return
+        position = self.scroll_position()
+        offset = int(position)
+        first, last = self.scroll_view.visible_tiles(offset)
+        tiles.prefetch(first, last + SCROLL_LOOKAHEAD)
+        # 每帧最多转换一块，转换的开销分摊到多帧
+        uploaded = tiles.upload()
+        dropped = tiles.retain(first, last + SCROLL_LOOKAHEAD)
+        if uploaded or dropped:
+            self.memory.charge('pixmaps', 'scroll', tiles.memory_size())
+        if offset != self.scroll_view.offset:
+            self.scroll_view.offset = offset
+            self.current_page = self.scroll_page()
+            self.frame_changed()
+        self.scroll_view.update()
+        if position >= self.scroll_max:
+            self.scroll_timer.stop()
+            self.publish_scroll('finished')
+    
+    def publish_scroll(self, state):
+        tiles = self.scroll_view.tiles
+        self.events.publish('scroll', {
+            'state': state,
+            'speed': self.scroll_speed,
+            'offset': self.scroll_view.offset,
+            'height': tiles.height if tiles is not None else 0,
+            'page': self.current_page,
+            'frame': self.frame_version
+        })
+    
+    def scroll_status(self):
+        """滚动状态及帧统计，可在 HTTP 线程中调用"""
+        tiles = self.scroll_view.tiles
+        status = {
+            'enabled': self.scroll_speed is not None,
+            'active': tiles is not None,
+            'speed': self.scroll_speed,
+            'offset': self.scroll_view.offset if tiles is not None else 0,
+            'max_offset': self.scroll_max if tiles is not None else 0,
+            'page': self.current_page,
+            'frames': self.scroll_stats.summary()
+        }
+        if tiles is not None:
+            status['tiles'] = tiles.stats()
+        return status
 
 # 全局变量用于优雅退出
 display_window = None
@@ -283,27 +931,418 @@ def run_display():
     window = DisplayWindow()
     sys.exit(app.exec())
 
-def run_server(display_window):
+def read_request_body(req):
+    """按 Content-Length 把请求体直接读入预先分配的缓冲区，避免分块拼接产生的额外拷贝"""
+    length = req.content_length
+    if length is None:
+        return req.stream.read()
+    buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
+        count = req.stream.readinto(view[received:])
+        if not count:
+            break
+        received += count
+    view.release()
+    if received < length:
+        del buf[received:]
+    return buf
+
+def create_app(display_window):
+    """创建 HTTP 接口"""
+    # Flask 不在模块加载时导入，见 preload_http_modules
+    from flask import Flask, request, jsonify, g, Response, abort
+    from werkzeug.exceptions import HTTPException
+    
     flask_app = Flask(__name__)
+    flask_app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_MB * 1024 * 1024
+    metrics = display_window.metrics
+    
+    # 会提交渲染任务的接口，渲染队列已满时拒绝
+    render_endpoints = {'display', 'display_image', 'render'}
+    
+    @flask_app.before_request
+    def start_timer():
+        g.start_time = time.perf_counter()
+    
+    @flask_app.before_request
+    def admission_control():
+        # 超大请求在读取请求体之前就拒绝
+        if request.content_length is not None and request.content_length > flask_app.config['MAX_CONTENT_LENGTH']:
+            abort(413)
+        if request.endpoint not in render_endpoints:
+            return None
+        pending = display_window.pipeline.pending()
+        if pending < RENDER_QUEUE_LIMIT:
+            return None
+        metrics.http_rejected.inc('render_queue')
+        response = jsonify({'error': 'Render queue full', 'pending': pending, 'retry_after': RETRY_AFTER})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(RETRY_AFTER)
+        return response
+    
+    @flask_app.errorhandler(413)
+    def payload_too_large(e):
+        return jsonify({'error': 'Payload too large', 'max_bytes': flask_app.config['MAX_CONTENT_LENGTH']}), 413
+    
+    @flask_app.after_request
+    def record_request(response):
+        endpoint = request.endpoint or 'unknown'
+        if 'start_time' in g:
+            metrics.http_latency.observe(time.perf_counter() - g.start_time, endpoint)
+        if response.status_code >= 400:
+            metrics.http_errors.inc(endpoint, str(response.status_code))
+        return response
+    
+    
+    def request_priority(data=None):
+        """优先级取自 JSON 的 priority 字段或查询参数，默认为 normal"""
+        if isinstance(data, dict) and 'priority' in data:
+            return data['priority']
+        return request.args.get('priority', 'normal')
+    
+    def invalid_priority(priority):
+        return jsonify({'error': 'Invalid priority', 'priority': priority, 'allowed': list(PRIORITIES)}), 400
     
     @flask_app.route('/display', methods=['POST'])
     def display():
         try:
             data = request.get_json()
-            if not data or 'content' not in data or 'type' not in data:
+            if not data or 'type' not in data:
                 return jsonify({'error': 'Invalid request format'}), 400
             
-            content = data['content']
             content_type = data['type']
             
             if content_type not in ['image', 'text', 'markdown']:
                 return jsonify({'error': 'Invalid content type'}), 400
             
-            display_window.signals.update_content.emit(content, content_type)
-            return jsonify({'status': 'success'})
+            priority = request_priority(data)
+            if priority not in PRIORITIES:
+                return invalid_priority(priority)
+            
+            # 按哈希引用已上传的图片资源
+            asset = data.get('asset')
+            if asset is not None:
+                if content_type != 'image':
+                    return jsonify({'error': 'Assets can only be displayed as images'}), 400
+                if not display_window.asset_store.has(asset):
+                    return jsonify({'error': 'Asset not found', 'asset': asset}), 404
+                job = display_window.update_content(None, content_type, asset, priority)
+                return jsonify({'status': 'success', 'job_id': job.id})
+            
+            if 'content' not in data:
+                return jsonify({'error': 'Invalid request format'}), 400
+            
+            job = display_window.update_content(data['content'], content_type, priority=priority)
+            return jsonify({'status': 'success', 'job_id': job.id})
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @flask_app.route('/render', methods=['POST'])
+    def render():
+        """只渲染不显示：返回页数和各页画面，用于预览分页效果；?page=N 时只返回第 N 页的图片"""
+        try:
+            data = request.get_json()
+            if not data or 'type' not in data:
+                return jsonify({'error': 'Invalid request format'}), 400
+            content_type = data['type']
+            if content_type not in ['image', 'text', 'markdown']:
+                return jsonify({'error': 'Invalid content type'}), 400
+            # 预览默认以低优先级渲染，不拖慢要上屏的内容
+            priority = data.get('priority', 'low')
+            if priority not in PRIORITIES:
+                return invalid_priority(priority)
+            fmt = request.args.get('format', 'png').lower()
+            if fmt not in SCREENSHOT_FORMATS:
+                return jsonify({'error': 'Invalid format', 'allowed': ['png', 'jpeg']}), 400
+            quality = -1
+            if SCREENSHOT_FORMATS[fmt][0] == 'JPEG':
+                quality = min(100, max(1, request.args.get('quality', 85, type=int)))
+            page = request.args.get('page', type=int)
+            if page is not None and page < 0:
+                return jsonify({'error': 'Invalid page'}), 400
+            
+            asset = data.get('asset')
+            if asset is not None:
+                if content_type != 'image':
+                    return jsonify({'error': 'Assets can only be displayed as images'}), 400
+                if not display_window.asset_store.has(asset):
+                    return jsonify({'error': 'Asset not found', 'asset': asset}), 404
+            elif 'content' not in data:
+                return jsonify({'error': 'Invalid request format'}), 400
+            
+            job = display_window.preview_content(data.get('content'), content_type, asset, priority)
+            if not job.finished.wait(RENDER_TIMEOUT):
+                # 放弃等待，渲染线程在下一个检查点结束该任务
+                job.cancelled = True
+                return jsonify({'error': 'Render timed out', 'job_id': job.id}), 504
+            try:
+                if job.status == 'failed':
+                    return jsonify({'error': job.error, 'job_id': job.id}), 422
+                if page is not None:
+                    page_count, frames = preview_frames(job, display_window.page_cache, page, 1)
+                    if not frames:
+                        return jsonify({'error': 'Page out of range', 'pages': page_count}), 404
+                    response = Response(encode_image(frames[0], fmt, quality), mimetype=SCREENSHOT_FORMATS[fmt][1])
+                    response.headers['X-Page-Count'] = str(page_count)
+                    response.headers['X-Job-Id'] = job.id
+                    return response
+                page_count, frames = preview_frames(job, display_window.page_cache, 0, RENDER_MAX_PAGES)
+                return jsonify({
+                    'job_id': job.id,
+                    'pages': page_count,
+                    'format': fmt,
+                    'timings': job.to_dict()['timings'],
+                    'images': [base64.b64encode(encode_image(frame, fmt, quality)).decode('ascii') for frame in frames],
+                    'truncated': len(frames) < page_count
+                })
+            finally:
+                job.release()
+        except HTTPException:
+            raise
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @flask_app.route('/display/image', methods=['POST'])
+    def display_image():
+        """上传图片：支持原始 image/* 请求体、multipart 表单和 data URI"""
+        try:
+            priority = request_priority()
+            if priority not in PRIORITIES:
+                return invalid_priority(priority)
+            if request.mimetype.startswith('image/'):
+                image_data = read_request_body(request)
+            elif request.mimetype == 'multipart/form-data':
+                upload = request.files.get('image') or next(iter(request.files.values()), None)
+                if upload is None:
+                    return jsonify({'error': 'No image file in form'}), 400
+                image_data = upload.read()
+            else:
+                # 兼容 {"content": "data:image/...;base64,..."} 形式
+                data = request.get_json(silent=True)
+                if not data or 'content' not in data:
+                    return jsonify({'error': 'Invalid request format'}), 400
+                image_data = data['content']
+                priority = data.get('priority', priority)
+                if priority not in PRIORITIES:
+                    return invalid_priority(priority)
+            
+            if not image_data:
+                return jsonify({'error': 'Empty image'}), 400
+            
+            job = display_window.update_content(image_data, 'image', priority=priority)
+            return jsonify({'status': 'success', 'job_id': job.id})
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @flask_app.route('/display/append', methods=['POST'])
+    def display_append():
+        """追加文本到当前文档：JSON 请求一次追加一段，原始文本请求体（可分块传输）边接收边显示"""
+        try:
+            if request.is_json:
+                data = request.get_json()
+                if not data or not isinstance(data.get('content'), str):
+                    return jsonify({'error': 'Invalid request format'}), 400
+                content_type = data.get('type', 'text')
+                reset = bool(data.get('reset', False))
+            else:
+                default_type = 'markdown' if request.mimetype == 'text/markdown' else 'text'
+                content_type = request.args.get('type', default_type)
+                reset = request.args.get('reset', '0') not in ('0', 'false', '')
+            if content_type not in ('text', 'markdown'):
+                return jsonify({'error': 'Invalid content type', 'allowed': ['text', 'markdown']}), 400
+
+            if request.is_json:
+                session = display_window.append_content(data['content'], content_type, reset)
+            else:
+                # 每收到一块就追加，多字节字符可能跨块，用增量解码
+                decoder = codecs.getincrementaldecoder('utf-8')('replace')
+                session = None
+                while True:
+                    chunk = request.stream.read(STREAM_READ_SIZE)
+                    text = decoder.decode(chunk, final=not chunk)
+                    if text or session is None and not chunk:
+                        session = display_window.append_content(text, content_type, reset and session is None)
+                    if not chunk:
+                        break
+            return jsonify({'status': 'success', 'stream': session.id, 'length': session.received})
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def read_upload():
+        """读取上传的资源数据：multipart 表单取第一个文件，否则取原始请求体"""
+        if request.mimetype == 'multipart/form-data':
+            upload = next(iter(request.files.values()), None)
+            return upload.read() if upload is not None else None
+        return read_request_body(request)
+    
+    @flask_app.route('/assets', methods=['POST'])
+    def upload_asset():
+        """上传资源，返回其 sha256 哈希"""
+        data = read_upload()
+        if not data:
+            return jsonify({'error': 'Empty asset'}), 400
+        digest = display_window.asset_store.put(data)
+        return jsonify({'status': 'success', 'hash': digest}), 201
+    
+    @flask_app.route('/assets/<digest>', methods=['PUT'])
+    def put_asset(digest):
+        """按哈希上传资源，内容与哈希不符时拒绝"""
+        if not AssetStore.is_valid_hash(digest):
+            return jsonify({'error': 'Invalid hash'}), 400
+        if display_window.asset_store.has(digest):
+            return jsonify({'status': 'exists', 'hash': digest})
+        data = read_upload()
+        if not data:
+            return jsonify({'error': 'Empty asset'}), 400
+        try:
+            display_window.asset_store.put(data, digest)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'status': 'success', 'hash': digest}), 201
+    
+    @flask_app.route('/assets/check', methods=['POST'])
+    def check_assets():
+        """批量检查哪些资源已存在"""
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('hashes'), list):
+            return jsonify({'error': 'Invalid request format'}), 400
+        return jsonify(display_window.asset_store.check(data['hashes']))
+    
+    @flask_app.route('/assets/stats', methods=['GET'])
+    def asset_stats():
+        """已解码画面缓存统计"""
+        return jsonify(display_window.asset_store.stats())
+    
+    @flask_app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        """查询渲染任务状态"""
+        job = display_window.pipeline.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+    
+    def parse_playlist_item(entry):
+        """校验播放列表条目，返回 (PlaylistItem, 错误信息)"""
+        if not isinstance(entry, dict) or entry.get('type') not in ['image', 'text', 'markdown']:
+            return None, 'Invalid content type'
+        duration = entry.get('duration', PLAYLIST_DEFAULT_DURATION)
+        if not isinstance(duration, (int, float)) or duration <= 0:
+            return None, 'Invalid duration'
+        asset = entry.get('asset')
+        if asset is not None:
+            if entry['type'] != 'image':
+                return None, 'Assets can only be displayed as images'
+            if not display_window.asset_store.has(asset):
+                return None, 'Asset not found'
+            return PlaylistItem(None, 'image', duration, asset), None
+        if not isinstance(entry.get('content'), str):
+            return None, 'Invalid request format'
+        return PlaylistItem(entry['content'], entry['type'], duration), None
+    
+    @flask_app.route('/playlist', methods=['POST'])
+    def set_playlist():
+        """设置播放列表，未变化的条目沿用已渲染的结果"""
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'Invalid request format'}), 400
+        items = []
+        for index, entry in enumerate(data['items']):
+            item, error = parse_playlist_item(entry)
+            if error:
+                return jsonify({'error': error, 'index': index}), 400
+            items.append(item)
+        changes = display_window.set_playlist(items, bool(data.get('loop', True)))
+        return jsonify({'status': 'success', 'keys': [item.key for item in items], **changes})
+    
+    @flask_app.route('/playlist', methods=['GET'])
+    def get_playlist():
+        """播放列表及各条目的渲染状态"""
+        return jsonify(display_window.playlist.status())
+    
+    @flask_app.route('/playlist', methods=['DELETE'])
+    def clear_playlist():
+        """清空播放列表，停止轮播"""
+        display_window.set_playlist([])
+        return jsonify({'status': 'success'})
+    
+    @flask_app.route('/events', methods=['GET'])
+    def events():
+        """Server-Sent Events：推送内容切换、翻页、渲染完成等事件"""
+        subscription = display_window.events.subscribe()
+        if subscription is None:
+            response = jsonify({'error': 'Too many event streams', 'retry_after': RETRY_AFTER})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(RETRY_AFTER)
+            return response
+        
+        def stream():
+            try:
+                yield 'retry: 3000\n\n'
+                while True:
+                    try:
+                        event = subscription.get(timeout=EVENT_HEARTBEAT)
+                    except queue.Empty:
+                        # 定期发送注释行，及时发现已断开的客户端
+                        yield ': keep-alive\n\n'
+                        continue
+                    yield format_sse(event)
+                    if event[1] == 'overflow':
+                        break
+            finally:
+                display_window.events.unsubscribe(subscription)
+        
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    @flask_app.route('/screenshot', methods=['GET'])
+    def screenshot():
+        """当前画面截图，同一画面的编码结果被所有请求共用"""
+        fmt = request.args.get('format', 'png').lower()
+        if fmt not in SCREENSHOT_FORMATS:
+            return jsonify({'error': 'Invalid format', 'allowed': ['png', 'jpeg']}), 400
+        quality = -1
+        if SCREENSHOT_FORMATS[fmt][0] == 'JPEG':
+            quality = min(100, max(1, request.args.get('quality', 85, type=int)))
+        version = display_window.frame_version
+        if f'{version}-{fmt}-{quality}' in request.if_none_match:
+            return Response(status=304)
+        try:
+            version, data = display_window.screenshots.get(version, fmt, quality)
+        except TimeoutError:
+            return jsonify({'error': 'Display busy'}), 503
+        response = Response(data, mimetype=SCREENSHOT_FORMATS[fmt][1])
+        response.set_etag(f'{version}-{fmt}-{quality}')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Frame-Version'] = str(version)
+        return response
+    
+    @flask_app.route('/projector/status', methods=['GET'])
+    def projector_status():
+        """投影仪电源状态及串口命令统计"""
+        projector = display_window.projector
+        if projector is None:
+            return jsonify({'enabled': False})
+        return jsonify({'enabled': True, 'port': projector.port, **projector.power_status(),
+                        'commands': projector.stats()})
+    
+    @flask_app.route('/startup', methods=['GET'])
+    def startup_report():
+        """启动各阶段完成的时刻（毫秒，以进程启动为零点）及后台预热耗时"""
+        return jsonify(startup.report())
+    
+    @flask_app.route('/pipeline/stats', methods=['GET'])
+    def pipeline_stats():
+        """渲染队列长度及被取代、取消的任务数"""
+        return jsonify(display_window.pipeline.stats())
+    
     @flask_app.route('/page/next', methods=['POST'])
     def next_page():
         """手动显示下一页"""
@@ -316,7 +1355,66 @@ def run_server(display_window):
         display_window.signals.prev_page.emit()
         return jsonify({'status': 'success'})
     
-    flask_app.run(host='0.0.0.0', port=5000)
+    @flask_app.route('/scroll', methods=['GET', 'POST', 'DELETE'])
+    def scroll():
+        """平滑滚动：POST 进入滚动模式或修改速度，DELETE 回到按页显示，GET 查询状态和帧统计"""
+        if request.method == 'DELETE':
+            display_window.signals.scroll_stop.emit()
+            return jsonify({'status': 'success'})
+        if request.method == 'GET':
+            return jsonify(display_window.scroll_status())
+        data = request.get_json(silent=True) or {}
+        speed = data.get('speed', request.args.get('speed', SCROLL_SPEED))
+        try:
+            speed = float(speed)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid speed'}), 400
+        if not 0 < speed <= SCROLL_MAX_SPEED:
+            return jsonify({'error': 'Invalid speed', 'max': SCROLL_MAX_SPEED}), 400
+        display_window.signals.scroll_start.emit(speed)
+        return jsonify({'status': 'success', 'speed': speed})
+    
+    @flask_app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus 文本格式的性能指标"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
+    @flask_app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        """公式缓存命中统计"""
+        return jsonify(display_window.formula_cache.stats())
+    
+    @flask_app.route('/memory', methods=['GET'])
+    def memory_stats():
+        """内存预算及各类别用量"""
+        return jsonify(display_window.memory.stats())
+    
+    return flask_app
+
+def preload_http_modules():
+    """提前导入 HTTP 服务用到的模块"""
+    import flask
+    import http_server
+
+def run_server(display_window):
+    flask_app = create_app(display_window)
+    if HTTP_SERVER == 'flask':
+        startup.mark('http_listening')
+        flask_app.run(host=HTTP_HOST, port=HTTP_PORT)
+        return
+    from http_server import PooledWSGIServer
+    server = PooledWSGIServer(
+        HTTP_HOST, HTTP_PORT, flask_app,
+        workers=HTTP_WORKERS,
+        max_pending=HTTP_MAX_PENDING,
+        read_timeout=HTTP_READ_TIMEOUT,
+        keep_alive_timeout=HTTP_KEEP_ALIVE,
+        retry_after=RETRY_AFTER,
+        on_reject=lambda: display_window.metrics.http_rejected.inc('connections')
+    )
+    startup.mark('http_listening')
+    print(f"HTTP 服务已启动: {HTTP_HOST}:{HTTP_PORT}，{HTTP_WORKERS} 个工作线程")
+    server.serve_forever()
 
 def main():
     global display_window, server_thread
@@ -331,9 +1429,16 @@ def main():
     os.environ['XDG_RUNTIME_DIR'] = '/run/user/1002'
     os.environ['WAYLAND_DISPLAY'] = 'wayland-0'
     
+    # Flask 等 HTTP 模块在后台导入，与窗口创建同时进行
+    Thread(target=preload_http_modules, name='preload', daemon=True).start()
+    
     # 创建显示窗口
     app = QApplication(sys.argv)
-    display_window = DisplayWindow()
+    startup.mark('qapplication')
+    display_window = DisplayWindow(STATE_FILE)
+    # 先显示上次的画面，再启动 HTTP 服务
+    if display_window.restore_state():
+        app.processEvents()
     
     # 启动HTTP服务器
     server_thread = Thread(target=run_server, args=(display_window,))
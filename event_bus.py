@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import queue
+import threading
+
+class EventBus:
+    """把显示状态变化推送给订阅者（如 /events 的 SSE 连接）
+
+    每个订阅者有自己的有界队列；消费太慢、队列已满的订阅者会收到 overflow 事件后被断开，
+    发布方从不阻塞。
+    """
+
+    def __init__(self, max_queue=256, max_subscribers=4):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.last = {}
+
+    def subscribe(self):
+        """新增订阅者，返回其队列；订阅者已满时返回 None"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            q = queue.Queue(self.max_queue)
+            # 先补发每类事件的最新一条，新连接不必等下一次变化才知道当前状态
+            for event in sorted(self.last.values(), key=lambda e: e[0]):
+                q.put_nowait(event)
+            self.subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def publish(self, event_type, data):
+        with self.lock:
+            event = (self.next_id, event_type, json.dumps({'time': time.time(), **data}, ensure_ascii=False))
+            self.next_id += 1
+            self.last[event_type] = event
+            for q in list(self.subscribers):
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    self.subscribers.discard(q)
+                    # 腾出一个位置放断开通知
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    q.put_nowait((event[0], 'overflow', '{}'))
+
+    def stats(self):
+        with self.lock:
+            return {'subscribers': len(self.subscribers), 'max_subscribers': self.max_subscribers,
+                    'last_event_id': self.next_id - 1}
+
+def format_sse(event):
+    """把事件编码为 text/event-stream 格式"""
+    event_id, event_type, data = event
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
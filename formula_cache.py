@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import tempfile
+import threading
+from functools import partial
+from collections import OrderedDict
+
+# 渲染方式变化时修改此版本号，使旧的缓存自动失效
+RENDER_VERSION = '2'
+
+class FormulaCache:
+    """LaTeX 公式渲染缓存：内存 LRU + 磁盘持久化
+
+    缓存的是公式的矢量轮廓，与字号、颜色无关，显示时再按需栅格化。
+    memory 为 MemoryAccountant 时，内存中的条目登记在 formulas 类别下，可被统一淘汰（磁盘缓存不受影响）。
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256, memory=None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory = memory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                print(f"无法创建公式缓存目录 {self.cache_dir}: {str(e)}")
+                self.cache_dir = None
+
+    @staticmethod
+    def make_key(latex):
+        """根据公式源码生成缓存键"""
+        raw = '\x00'.join([RENDER_VERSION, latex])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.path')
+
+    def _remember(self, key, data):
+        """在锁内调用，返回超出条目上限而被淘汰的键"""
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False)[0])
+        return evicted
+
+    def _account(self, key, data, evicted):
+        """在锁外登记新条目、注销被淘汰的条目"""
+        if self.memory is None:
+            return
+        for old in evicted:
+            self.memory.release('formulas', old)
+        self.memory.charge('formulas', key, len(data), partial(self._evict, key, data))
+        with self.lock:
+            stale = self.entries.get(key) is not data
+        if stale:
+            self.memory.release('formulas', key)
+
+    def _evict(self, key, data):
+        with self.lock:
+            if self.entries.get(key) is data:
+                del self.entries[key]
+
+    def get(self, key):
+        """查找缓存，未命中返回 None"""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+        if data is not None:
+            if self.memory is not None:
+                self.memory.touch('formulas', key)
+            return data
+
+        data = None
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+
+        with self.lock:
+            if data:
+                self.disk_hits += 1
+                evicted = self._remember(key, data)
+            else:
+                self.misses += 1
+                return None
+        self._account(key, data, evicted)
+        return data
+
+    def put(self, key, data):
+        """写入内存缓存，并原子地写入磁盘"""
+        with self.lock:
+            evicted = self._remember(key, data)
+        self._account(key, data, evicted)
+
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入公式缓存失败: {str(e)}")
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'cache_dir': self.cache_dir
+            }
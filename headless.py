@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt6.QtGui import QFont
+from formula_cache import FormulaCache
+from latex_renderer import FormulaRenderer
+from content_renderer import ContentRenderer, SCREEN_WIDTH, SCREEN_HEIGHT, PAGE_PADDING, FONT_FAMILY, FONT_SIZE
+from render_pipeline import RenderPipeline
+from page_cache import PageCache
+
+def preview_frames(job, page_cache, first=0, count=None):
+    """把渲染完成的预览任务画成整屏图片，返回 (总页数, 从 first 页起最多 count 页的 QImage 列表)"""
+    if job.content_type == 'image':
+        page_count = 1
+    else:
+        page_count = len(job.pages)
+    stop = page_count if count is None else min(page_count, first + count)
+    if job.content_type == 'image':
+        # 图片在解码阶段已合成为整屏画面
+        return page_count, [job.image] if first < stop else []
+    return page_count, [page_cache.render(job.pages, index) for index in range(first, stop)]
+
+class HeadlessRenderer:
+    """不创建窗口的显示流水线：与显示服务相同的字体、排版和公式渲染，结果画成整屏图片而不上屏
+
+    需要先创建 QGuiApplication（无显示器时使用 offscreen 平台）。公式轮廓写入与显示服务
+    相同的磁盘缓存，预先渲染过的文档在显示服务中不必再渲染公式。
+    """
+
+    def __init__(self, formula_cache_dir=None, formula_workers=0, asset_store=None, color='white'):
+        self.formula_cache = FormulaCache(formula_cache_dir)
+        self.formula_renderer = FormulaRenderer(self.formula_cache, color, formula_workers)
+        self.renderer = ContentRenderer(self.formula_renderer, QFont(FONT_FAMILY, FONT_SIZE), asset_store)
+        # 每个任务都要渲染完，不合并
+        self.pipeline = RenderPipeline(self.renderer.stages(), lambda job: None, coalesce=False)
+        self.pipeline.start()
+        self.page_cache = PageCache(SCREEN_WIDTH, SCREEN_HEIGHT, PAGE_PADDING, 0)
+
+    def submit(self, content, content_type, asset=None):
+        """提交预览任务，立即返回 RenderJob；多个任务在流水线各阶段中重叠进行"""
+        return self.pipeline.submit(content, content_type, asset, preview=True)
+
+    def render(self, content, content_type, asset=None):
+        """渲染一份内容，返回 (RenderJob, 总页数, 各页 QImage)；渲染失败时抛出异常"""
+        job = self.submit(content, content_type, asset)
+        job.finished.wait()
+        return (job, *self.frames(job))
+
+    def frames(self, job, first=0, count=None):
+        if job.status == 'failed':
+            raise Exception(job.error)
+        return preview_frames(job, self.page_cache, first, count)
+
+    def shutdown(self):
+        self.pipeline.stop()
+        self.page_cache.shutdown()
+        self.formula_renderer.shutdown()
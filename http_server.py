@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import queue
+import socket
+import threading
+from types import SimpleNamespace
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, DechunkedInput
+from werkzeug.wsgi import LimitedStream
+
+class ChunkedInput(DechunkedInput):
+    """分块传输的请求体：每次读取最多返回当前一块的数据，不等凑满缓冲区，边传边处理的请求可以及时拿到数据"""
+
+    def readinto(self, buf):
+        view = memoryview(buf)
+        read = super().readinto(view[:1])
+        if read and self._len:
+            read += super().readinto(view[1:1 + self._len])
+        return read
+
+def make_handler(read_timeout, keep_alive_timeout, max_drain=64 * 1024):
+    """按配置生成请求处理类
+
+    read_timeout 限制读取一个请求的时间，keep_alive_timeout 限制长连接空闲等待下一个请求的时间，
+    为 0 时每个请求后都断开连接。
+    """
+
+    class Handler(WSGIRequestHandler):
+        timeout = read_timeout
+        protocol_version = 'HTTP/1.1'
+        body = None
+        served = False
+
+        def setup(self):
+            super().setup()
+            # 响应头和响应体分两次写出，关闭 Nagle 算法避免长连接上的第二个请求多等 40ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def handle_one_request(self):
+            if self.served:
+                # 空闲的长连接占着工作线程，等下一个请求的时间要比读超时短
+                self.connection.settimeout(keep_alive_timeout)
+            super().handle_one_request()
+            self.served = True
+
+        def parse_request(self):
+            self.connection.settimeout(read_timeout)
+            return super().parse_request()
+
+        def make_environ(self):
+            environ = super().make_environ()
+            if isinstance(environ['wsgi.input'], DechunkedInput):
+                environ['wsgi.input'] = ChunkedInput(self.rfile)
+            if keep_alive_timeout > 0 and 'chunked' not in environ.get('HTTP_TRANSFER_ENCODING', '').lower():
+                # 记下请求体，响应后读掉未读完的部分，连接才能继续复用
+                self.body = LimitedStream(self.rfile, int(environ.get('CONTENT_LENGTH') or 0))
+                environ['wsgi.input'] = self.body
+                # werkzeug 在响应后会把套接字里剩下的数据全部读掉，长连接上的下一个请求也会被吞掉
+                self.socket_rfile = self.rfile
+                self.rfile = SimpleNamespace(read=self.read_leftover)
+            return environ
+
+        def read_leftover(self, size=-1):
+            if self.close_connection:
+                return self.socket_rfile.read(size)
+            return b''
+
+        def send_header(self, keyword, value):
+            # werkzeug 总是回复 Connection: close；剩余请求体不多时改为保持连接
+            if keyword.lower() == 'connection' and self.body is not None and not self.close_connection:
+                if self.body.limit - self.body.tell() <= max_drain:
+                    return
+                self.close_connection = True
+            super().send_header(keyword, value)
+
+        def run_wsgi(self):
+            try:
+                super().run_wsgi()
+                if self.body is None:
+                    self.close_connection = True
+                elif not self.close_connection:
+                    self.body.exhaust()
+            finally:
+                if self.body is not None:
+                    self.rfile = self.socket_rfile
+                    self.body = None
+
+        def log_error(self, format, *args):
+            # 空闲的长连接超时断开属于正常情况
+            if format.startswith('Request timed out'):
+                return
+            super().log_error(format, *args)
+
+        def log_request(self, code='-', size='-'):
+            # 成功的请求已经计入 /metrics，只记录错误
+            try:
+                status = int(code)
+            except (TypeError, ValueError):
+                status = 0
+            if status >= 400:
+                super().log_request(code, size)
+
+    return Handler
+
+class PooledWSGIServer(BaseWSGIServer):
+    """固定线程数的 WSGI 服务器
+
+    连接交给线程池处理；正在处理和排队的连接总数超过上限时，
+    直接回复 503 和 Retry-After，不再让请求无限堆积。
+    """
+
+    multithread = True
+    request_queue_size = 64
+
+    def __init__(self, host, port, app, workers=4, max_pending=16, read_timeout=10.0,
+                 keep_alive_timeout=5.0, retry_after=1, on_reject=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.on_reject = on_reject
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.active = 0
+        self.active_lock = threading.Lock()
+        self.connections = queue.Queue()
+        super().__init__(host, port, app, handler=make_handler(read_timeout, keep_alive_timeout))
+        # 守护线程：长连接或 /events 这类长时间的响应不会阻止进程退出
+        self.threads = [threading.Thread(target=self._worker, name=f'http-{i}', daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.reject(request)
+            return
+        self.connections.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            item = self.connections.get()
+            if item is None:
+                break
+            self._process(*item)
+
+    def _process(self, request, client_address):
+        with self.active_lock:
+            self.active += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.active_lock:
+                self.active -= 1
+            self.slots.release()
+
+    def reject(self, request):
+        """在接收线程里直接回复 503，不读取请求内容"""
+        body = json.dumps({'error': 'Server busy', 'retry_after': self.retry_after}).encode()
+        head = (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            f'Retry-After: {self.retry_after}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode()
+        try:
+            request.settimeout(1.0)
+            request.sendall(head + body)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+        if self.on_reject:
+            self.on_reject()
+
+    def stats(self):
+        with self.active_lock:
+            active = self.active
+        return {'workers': self.workers, 'max_pending': self.max_pending, 'active': active}
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.threads:
+            self.connections.put(None)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from io import BytesIO
+from PyQt6.QtGui import QImage, QImageReader
+from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODevice, QSize
+
+# Pillow 在第一次解码图片时才导入
+Image = None
+_pillow_checked = False
+
+def load_pillow():
+    """按需导入 Pillow，未安装时返回 None"""
+    global Image, _pillow_checked
+    if not _pillow_checked:
+        try:
+            from PIL import Image as pil_image
+            Image = pil_image
+        except ImportError:
+            print("警告：未安装 Pillow，图片将使用 Qt 解码")
+            print("安装命令：pip install Pillow")
+        _pillow_checked = True
+    return Image
+
+def fit_size(width, height, max_width, max_height):
+    """保持宽高比缩放到屏幕内的尺寸"""
+    scale = min(max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def _load_with_pillow(data, max_width, max_height):
+    timings = {}
+    start = time.perf_counter()
+    image = Image.open(BytesIO(data))
+    size = fit_size(image.width, image.height, max_width, max_height)
+    # JPEG 在 DCT 域直接按 1/2、1/4、1/8 缩小解码，不必解出全部像素
+    image.draft('RGB', size)
+    image.load()
+    timings['image_decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        fmt = QImage.Format.Format_RGBA8888
+        channels = 4
+    else:
+        image = image.convert('RGB')
+        fmt = QImage.Format.Format_RGB888
+        channels = 3
+
+    if size != image.size:
+        # 先按整数倍快速缩小，再做双线性插值
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    raw = image.tobytes()
+    result = QImage(raw, image.width, image.height, image.width * channels, fmt).copy()
+    timings['image_scale'] = time.perf_counter() - start
+    return result, timings
+
+def _load_with_qt(data, max_width, max_height):
+    timings = {}
+    start = time.perf_counter()
+    buffer = QBuffer()
+    buffer.setData(QByteArray(bytes(data)))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    original = reader.size()
+    if original.isValid():
+        # Qt 的 JPEG 插件在设置缩放尺寸时同样会缩小解码
+        reader.setScaledSize(QSize(*fit_size(original.width(), original.height(), max_width, max_height)))
+    image = reader.read()
+    if image.isNull():
+        raise Exception(f"无法从数据创建QImage: {reader.errorString()}")
+    timings['image_decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not original.isValid():
+        image = image.scaled(
+            max_width, max_height,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+    timings['image_scale'] = time.perf_counter() - start
+    return image, timings
+
+def load_screen_image(data, max_width, max_height):
+    """解码图片并缩放到屏幕尺寸，返回 (QImage, 各步骤耗时)"""
+    if load_pillow() is not None:
+        try:
+            return _load_with_pillow(data, max_width, max_height)
+        except Exception as e:
+            print(f"Pillow 解码失败，改用 Qt 解码: {str(e)}")
+    return _load_with_qt(data, max_width, max_height)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import struct
+import threading
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from formula_cache import FormulaCache
+
+# 扫描 Markdown 时关心的记号：围栏代码块的开始行、行内代码的反引号串、转义字符、公式定界符
+TOKEN_PATTERN = re.compile(r'^ {0,3}(?P<fence>`{3,}|~{3,})|(?P<ticks>`+)|\\(?P<escaped>[^\n])|(?P<math>\$\$?)', re.M)
+FENCE_CLOSE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})[ \t]*$', re.M)
+TICK_RUN_PATTERN = re.compile(r'`+')
+# 块级公式可以跨行，到第一个未转义的 $$ 结束
+BLOCK_MATH_PATTERN = re.compile(r'\$\$((?:[^\\$]|\\.|\$(?!\$))+?)\$\$', re.S)
+# 行内公式不跨行；$ 之后、结束的 $ 之前不能是空白，结束的 $ 之后不能是数字，"$5 和 $10" 不是公式
+INLINE_MATH_PATTERN = re.compile(r'\$(?=[^\s$])((?:[^\\$\n]|\\[^\n])+?)(?<=\S)\$(?!\d)')
+# 公式图片在文档中的资源地址前缀，后接缓存键的前 16 位和字号
+FORMULA_URL_PREFIX = 'formula:'
+# 公式轮廓按该字号提取，之后按需缩放到任意字号
+PATH_UNITS = 100.0
+# 字号（磅）换算为像素时的分辨率
+FORMULA_DPI = 100
+# matplotlib Path 的顶点类型
+MOVETO, LINETO, CURVE3, CURVE4, CLOSEPOLY = 1, 2, 3, 4, 79
+PATH_HEADER = struct.Struct('<4fI')
+
+def _fence_end(content, pos, fence):
+    """围栏代码块结束行之后的位置，没有结束行时代码块一直延续到文末"""
+    for match in FENCE_CLOSE_PATTERN.finditer(content, pos):
+        closing = match.group(1)
+        if closing[0] == fence[0] and len(closing) >= len(fence):
+            return match.end()
+    return len(content)
+
+def _code_span_end(content, pos, length):
+    """与开头长度相同的反引号串之后的位置，找不到时返回 -1"""
+    for match in TICK_RUN_PATTERN.finditer(content, pos):
+        if len(match.group()) == length:
+            return match.end()
+    return -1
+
+def tokenize_math(content):
+    """单遍扫描 Markdown，按出现顺序返回公式记号 (开始, 结束, 类型, 公式源码)
+
+    类型为 block（$$...$$）、inline（$...$）或 escape（\\$，显示为 $）。围栏代码块和行内代码原样保留；
+    找不到结束定界符的 $ 和反引号按普通字符处理。向后查找失败的结果会记下，整体扫描为线性时间。
+    """
+    tokens = []
+    # 之后不再有相同长度反引号串的长度，以及之后不再有 $$ 结尾
+    unclosed_ticks = set()
+    block_unclosed = False
+    pos = 0
+    while True:
+        match = TOKEN_PATTERN.search(content, pos)
+        if match is None:
+            break
+        start, pos = match.span()
+        if match.group('fence'):
+            pos = _fence_end(content, pos, match.group('fence'))
+        elif match.group('ticks'):
+            length = len(match.group('ticks'))
+            if length not in unclosed_ticks:
+                end = _code_span_end(content, pos, length)
+                if end < 0:
+                    unclosed_ticks.add(length)
+                else:
+                    pos = end
+        elif match.group('escaped') is not None:
+            if match.group('escaped') == '$':
+                tokens.append((start, pos, 'escape', None))
+        elif match.group('math') == '$$':
+            formula = None if block_unclosed else BLOCK_MATH_PATTERN.match(content, start)
+            if formula is not None:
+                tokens.append((start, formula.end(), 'block', formula.group(1)))
+                pos = formula.end()
+            else:
+                block_unclosed = True
+        else:
+            formula = INLINE_MATH_PATTERN.match(content, start)
+            if formula is not None:
+                tokens.append((start, formula.end(), 'inline', formula.group(1)))
+                pos = formula.end()
+    return tokens
+
+def pack_path(box, codes, vertices):
+    """把公式轮廓打包为字节：外框 (x0, y0, x1, y1)、顶点类型和顶点坐标，y 轴向上、基线为 0"""
+    codes = bytes(codes)
+    coordinates = array('f', (value for vertex in vertices for value in vertex))
+    return PATH_HEADER.pack(*box, len(codes)) + codes + coordinates.tobytes()
+
+def unpack_path(data):
+    """解开 pack_path 的结果，返回 (外框, 顶点类型, 顶点坐标列表)"""
+    *box, count = PATH_HEADER.unpack_from(data)
+    offset = PATH_HEADER.size
+    codes = data[offset:offset + count]
+    coordinates = array('f')
+    coordinates.frombytes(data[offset + count:offset + count + count * 8])
+    return box, codes, coordinates
+
+def formula_path(latex):
+    """用 matplotlib mathtext 把公式转为矢量轮廓（按 PATH_UNITS 字号），返回打包后的字节"""
+    from matplotlib.textpath import TextPath, text_to_path
+    from matplotlib.font_manager import FontProperties
+
+    source = f'${latex}$'
+    prop = FontProperties(size=PATH_UNITS)
+    width, height, descent = text_to_path.get_text_width_height_descent(source, prop, ismath=True)
+    path = TextPath((0, 0), source, size=PATH_UNITS, prop=prop)
+    codes = path.codes
+    if codes is None:
+        codes = [MOVETO] + [LINETO] * (len(path.vertices) - 1)
+    # 外框取排版盒与实际笔画的并集：行内公式按排版盒对齐，伸出盒外的笔画也不会被裁掉
+    box = [0.0, -float(descent), float(width), float(height - descent)]
+    if len(path.vertices):
+        extents = path.get_extents()
+        box = [min(box[0], extents.x0), min(box[1], extents.y0), max(box[2], extents.x1), max(box[3], extents.y1)]
+    return pack_path(box, codes, path.vertices)
+
+def _render_job(latex):
+    """工作进程入口，渲染失败时返回错误信息而不是抛出异常"""
+    try:
+        return formula_path(latex), None
+    except Exception as e:
+        return None, str(e)
+
+def _warm_up_worker():
+    """工作进程初始化：提前导入 matplotlib 并预热 mathtext 和字体缓存"""
+    formula_path(r'\frac{a}{b}')
+
+def _noop():
+    return os.getpid()
+
+class FormulaRenderer:
+    """将一篇文档中的所有公式一次性交给常驻进程池并行渲染"""
+
+    def __init__(self, cache, color='white', workers=None):
+        self.cache = cache
+        self.color = color
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 1) - 1)
+        self.workers = workers
+        self.pool = None
+        self.starting = []
+        self.ready = False
+        self.warm_up_lock = threading.Lock()
+
+    def start(self):
+        """启动工作进程，进程在后台导入 matplotlib 并预热"""
+        if self.pool is not None or self.workers <= 0:
+            return
+        try:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_up_worker
+            )
+            # 同时提交与进程数相同的空任务，让所有工作进程立即启动
+            self.starting = [self.pool.submit(_noop) for _ in range(self.workers)]
+            print(f"公式渲染进程池已启动，工作进程数: {self.workers}")
+        except Exception as e:
+            print(f"公式渲染进程池启动失败，改为在当前进程渲染: {str(e)}")
+            self.pool = None
+
+    def warm_up(self):
+        """启动工作进程并等待预热完成；不使用进程池时在当前进程中预热 matplotlib
+
+        第一个公式请求也会调用这里，预热正在进行时等它完成，而不是另外冷启动渲染。
+        """
+        with self.warm_up_lock:
+            if self.ready:
+                return
+            self.start()
+            try:
+                for future in self.starting:
+                    future.result()
+            except Exception as e:
+                print(f"公式渲染进程预热失败，改为在当前进程渲染: {str(e)}")
+                self.shutdown()
+            if self.pool is None:
+                try:
+                    _warm_up_worker()
+                except Exception as e:
+                    print(f"公式渲染预热失败: {str(e)}")
+            self.starting = []
+            self.ready = True
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _render_many(self, jobs, cancelled=None):
+        """渲染一批公式，返回与 jobs 顺序一致的 (公式轮廓, error) 列表；中途被取消时返回 None"""
+        self.warm_up()
+        if self.pool is not None:
+            futures = []
+            try:
+                futures = [self.pool.submit(_render_job, job) for job in jobs]
+                results = []
+                for future in futures:
+                    if cancelled is not None and cancelled():
+                        return None
+                    results.append(future.result())
+                return results
+            except Exception as e:
+                print(f"公式渲染进程池出错，改为在当前进程渲染: {str(e)}")
+                self.shutdown()
+            finally:
+                # 取消时撤回还没开始的公式，把工作进程让给新的文档
+                for future in futures:
+                    future.cancel()
+        results = []
+        for job in jobs:
+            if cancelled is not None and cancelled():
+                return None
+            results.append(_render_job(job))
+        return results
+
+    @staticmethod
+    def formula_html(url, should_center):
+        if should_center:
+            return f'<div style="text-align: center; margin: 10px 0;"><img src="{url}" style="background-color: transparent;" /></div>'
+        return f'<img src="{url}" style="background-color: transparent; vertical-align: middle;" />'
+
+    def render_math(self, content, cancelled=None):
+        """把文本中的 LaTeX 公式替换为引用图片资源的 HTML，返回 (HTML, {资源地址: (公式轮廓, 字号)})
+
+        同一公式在文档中只有一个资源，由排版时按字号栅格化并注册到文档中，HTML 里只有简短的地址。
+        cancelled 为可选的回调，在公式之间检查，返回真时放弃渲染并返回 None。
+        """
+        formulas = []
+        for start, end, kind, latex in tokenize_math(content):
+            if kind == 'escape':
+                formulas.append((start, end, None, False, 0, None))
+                continue
+            before_newline = content[max(0, start - 2):start].endswith('\n')
+            after_newline = content[end:min(len(content), end + 2)].startswith('\n')
+            should_center = before_newline and after_newline
+            fontsize = 24 if should_center else 20
+            formulas.append((start, end, latex, should_center, fontsize, FormulaCache.make_key(latex)))
+
+        if not formulas:
+            return content, {}
+
+        # 先查缓存，未命中的公式去重后一起提交；轮廓与字号、颜色无关，不同字号共用
+        rendered = {}
+        pending = {}
+        for _, _, latex, _, _, key in formulas:
+            if key is None or key in rendered or key in pending:
+                continue
+            path_data = self.cache.get(key)
+            if path_data is not None:
+                rendered[key] = path_data
+            else:
+                pending[key] = latex
+
+        if pending:
+            print(f"正在渲染 {len(pending)} 个公式...")
+            keys = list(pending)
+            results = self._render_many([pending[k] for k in keys], cancelled)
+            if results is None:
+                print("文档已被新内容取代，停止渲染公式")
+                return None
+            for key, (path_data, error) in zip(keys, results):
+                if path_data is None:
+                    print(f"公式渲染失败: {pending[key]}, 错误: {error}")
+                    continue
+                self.cache.put(key, path_data)
+                rendered[key] = path_data
+                print(f"公式渲染成功: {pending[key]}")
+
+        # 按原顺序拼接
+        parts = []
+        images = {}
+        last = 0
+        for start, end, latex, should_center, fontsize, key in formulas:
+            parts.append(content[last:start])
+            if key is None:
+                parts.append('$')
+            elif key in rendered:
+                url = f'{FORMULA_URL_PREFIX}{key[:16]}-{fontsize}'
+                images[url] = (rendered[key], fontsize)
+                parts.append(self.formula_html(url, should_center))
+            else:
+                parts.append(f'<div class="math">Error: {latex}</div>')
+            last = end
+        parts.append(content[last:])
+        return ''.join(parts), images
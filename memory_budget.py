@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+class MemoryEntry:
+    def __init__(self, size, evict, pinned):
+        self.size = size
+        self.evict = evict
+        self.pinned = pinned
+
+class MemoryAccountant:
+    """统一记账：原始内容、排版结果、页面画面和各类缓存占用的字节数，超出预算时按最久未使用淘汰
+
+    条目按 (类别, 键) 登记，并给出淘汰回调；正在显示的内容等固定的条目、以及没有淘汰回调的条目只记账不淘汰。
+    on_over_budget 不为空时，超出预算只调用它一次，由调用方在合适的线程中执行 enforce()
+    （QPixmap 只能在 GUI 线程中释放）；为空时在登记的线程中直接淘汰。
+    """
+
+    def __init__(self, budget, on_over_budget=None):
+        self.budget = budget
+        self.on_over_budget = on_over_budget
+        self.entries = OrderedDict()
+        self.evictions = {}
+        self.total = 0
+        self.peak = 0
+        self.requested = False
+        self.lock = threading.Lock()
+
+    def _remove(self, category, key):
+        entry = self.entries.pop((category, key), None)
+        if entry is not None:
+            self.total -= entry.size
+        return entry
+
+    def _needs_enforce(self):
+        """在锁内调用：超出预算且还没有安排淘汰时返回 True"""
+        if self.total <= self.budget or self.requested:
+            return False
+        if self.on_over_budget is not None:
+            self.requested = True
+        return True
+
+    def _over_budget(self):
+        if self.on_over_budget is not None:
+            self.on_over_budget()
+        else:
+            self.enforce()
+
+    def charge(self, category, key, size, evict=None, pinned=False):
+        """登记或更新条目占用的字节数，同时视为刚被使用"""
+        with self.lock:
+            self._remove(category, key)
+            self.entries[(category, key)] = MemoryEntry(size, evict, pinned)
+            self.total += size
+            self.peak = max(self.peak, self.total)
+            request = self._needs_enforce()
+        if request:
+            self._over_budget()
+
+    def touch(self, category, key):
+        """条目被使用，移到最近使用的一端"""
+        with self.lock:
+            if (category, key) in self.entries:
+                self.entries.move_to_end((category, key))
+
+    def pin(self, category, key, pinned=True):
+        """固定的条目不会被淘汰；取消固定后可以淘汰，视为刚被使用"""
+        with self.lock:
+            entry = self.entries.get((category, key))
+            if entry is None:
+                return
+            entry.pinned = pinned
+            self.entries.move_to_end((category, key))
+            request = not pinned and self._needs_enforce()
+        if request:
+            self._over_budget()
+
+    def release(self, category, key):
+        """条目已被持有者自行释放，注销记账"""
+        with self.lock:
+            self._remove(category, key)
+
+    def enforce(self):
+        """从最久未使用的条目开始淘汰，直到用量不超过预算，返回淘汰的条目数"""
+        victims = []
+        with self.lock:
+            self.requested = False
+            for (category, key), entry in list(self.entries.items()):
+                if self.total <= self.budget:
+                    break
+                if entry.pinned or entry.evict is None:
+                    continue
+                self._remove(category, key)
+                self.evictions[category] = self.evictions.get(category, 0) + 1
+                victims.append((category, entry.evict))
+        # 回调会获取各缓存自己的锁，在记账的锁外调用
+        for category, evict in victims:
+            try:
+                evict()
+            except Exception as e:
+                print(f"淘汰 {category} 条目失败: {str(e)}")
+        return len(victims)
+
+    def stats(self):
+        with self.lock:
+            categories = {}
+            pinned = 0
+            for (category, _), entry in self.entries.items():
+                info = categories.setdefault(category, {'bytes': 0, 'entries': 0, 'pinned_bytes': 0})
+                info['bytes'] += entry.size
+                info['entries'] += 1
+                if entry.pinned or entry.evict is None:
+                    info['pinned_bytes'] += entry.size
+                    pinned += entry.size
+            for category, count in self.evictions.items():
+                categories.setdefault(category, {'bytes': 0, 'entries': 0, 'pinned_bytes': 0})['evictions'] = count
+            for info in categories.values():
+                info.setdefault('evictions', 0)
+            return {
+                'budget': self.budget,
+                'used': self.total,
+                'peak': self.peak,
+                'pinned': pinned,
+                'categories': categories
+            }
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+from render_pipeline import DROPPED_STATUSES
+
+# 延迟分布的桶边界（秒），覆盖 1ms 到 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 帧间隔的桶边界（秒），在 60fps 的 16.7ms 附近细分
+FRAME_BUCKETS = (0.008, 0.0125, 0.015, 0.0167, 0.018, 0.02, 0.025, 0.0334, 0.05, 0.1, 0.25)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                       for k, v in pairs)
+    return '{' + escaped + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+class Gauge:
+    """数值在抓取时由回调函数给出"""
+
+    def __init__(self, name, help_text, function):
+        self.name = name
+        self.help = help_text
+        self.function = function
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge',
+                f'{self.name} {_format_value(self.function())}']
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """记录一次观测值，只做一次二分查找和几次加法"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+class MetricsRegistry:
+    """Prometheus 文本格式的指标集合"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, function):
+        metric = Gauge(name, help_text, function)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class DisplayMetrics(MetricsRegistry):
+    """显示服务的各项指标"""
+
+    def __init__(self):
+        super().__init__()
+        self.http_latency = self.histogram(
+            'display_http_request_duration_seconds', 'HTTP 请求处理耗时', ('endpoint',))
+        self.http_errors = self.counter(
+            'display_http_errors_total', 'HTTP 错误响应数', ('endpoint', 'status'))
+        self.http_rejected = self.counter(
+            'display_http_rejected_total', '因过载被拒绝的请求数', ('reason',))
+        self.requests = self.counter(
+            'display_requests_total', '提交的显示内容数', ('type',))
+        self.end_to_end = self.histogram(
+            'display_end_to_end_seconds', '从收到 /display 请求到内容显示在屏幕上的耗时', ('type',))
+        self.stage_latency = self.histogram(
+            'display_stage_duration_seconds', '渲染各阶段耗时', ('stage', 'type'))
+        self.render_errors = self.counter(
+            'display_render_errors_total', '渲染失败数', ('type',))
+        self.render_dropped = self.counter(
+            'display_renders_dropped_total', '被新内容取代而没有显示的渲染任务数', ('reason', 'type'))
+        self.stream_update = self.histogram(
+            'display_stream_update_seconds', '追加内容的增量排版耗时', ('type',))
+        self.stream_chars = self.counter(
+            'display_stream_chars_total', '追加显示收到的字符数', ('type',))
+        self.page_flip = self.histogram(
+            'display_page_flip_seconds', '翻页显示耗时', ('source',))
+        self.snapshot_write = self.histogram(
+            'display_snapshot_write_seconds', '状态快照写入磁盘的耗时')
+        self.scroll_frame = self.histogram(
+            'display_scroll_frame_interval_seconds', '平滑滚动相邻两帧的间隔', buckets=FRAME_BUCKETS)
+
+    def observe_job(self, job):
+        """记录一个渲染任务各阶段的耗时"""
+        for stage, seconds in job.timings.items():
+            self.stage_latency.observe(seconds, stage, job.content_type)
+        if job.status == 'failed':
+            self.render_errors.inc(job.content_type)
+        elif job.status in DROPPED_STATUSES:
+            self.render_dropped.inc(job.status, job.content_type)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtCore import Qt
+
+class PageCache:
+    """整页画面缓存：每页只光栅化一次，后台预取相邻页
+
+    memory 为 MemoryAccountant 时，每页画面以各自的序号登记在 pages 类别下，可被统一淘汰。
+    """
+
+    def __init__(self, width, height, padding, max_pages=5, on_ready=None, memory=None):
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.max_pages = max_pages
+        self.on_ready = on_ready
+        self.memory = memory
+        self.pages = None
+        self.generation = 0
+        # 页号 -> (序号, 画面)；序号用于记账，同一页重新渲染后序号不同
+        self.frames = OrderedDict()
+        self.serial = itertools.count()
+        self.pending = set()
+        self.lock = threading.Lock()
+        # 同一份文档同一时间只允许一个线程绘制
+        self.draw_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch')
+
+    def set_pages(self, pages, first_frame=None):
+        """换上新的分页结果，旧画面全部作废；first_frame 为预先画好的第一页"""
+        with self.lock:
+            self.pages = pages
+            self.generation += 1
+            dropped = [key for key, _ in self.frames.values()]
+            self.frames.clear()
+            self.pending.clear()
+            if first_frame is not None:
+                key = next(self.serial)
+                self.frames[0] = (key, first_frame)
+            generation = self.generation
+        self._release(dropped)
+        if first_frame is not None:
+            self._charge(0, key, first_frame)
+        return generation
+
+    def invalidate(self, first):
+        """当前文档从第 first 页起有变化（如追加了内容），之前的页面画面继续使用"""
+        with self.lock:
+            self.generation += 1
+            dropped = [self.frames.pop(i)[0] for i in [i for i in self.frames if i >= first]]
+            self.pending.clear()
+            generation = self.generation
+        self._release(dropped)
+        return generation
+
+    def _charge(self, index, key, image):
+        if self.memory is None:
+            return
+        self.memory.charge('pages', key, image.sizeInBytes(), partial(self._evict, index, key))
+        # 记账在锁外进行，期间画面可能已被换掉
+        with self.lock:
+            frame = self.frames.get(index)
+            stale = frame is None or frame[0] != key
+        if stale:
+            self.memory.release('pages', key)
+
+    def _release(self, keys):
+        if self.memory is not None:
+            for key in keys:
+                self.memory.release('pages', key)
+
+    def _evict(self, index, key):
+        """统一淘汰时回调：该页仍是登记时的画面才移除"""
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None and frame[0] == key:
+                del self.frames[index]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, pages, index):
+        """把一页画成屏幕大小的图片"""
+        image = QImage(self.width, self.height, QImage.Format.Format_RGB32)
+        image.fill(Qt.GlobalColor.black)
+        painter = QPainter(image)
+        painter.translate(self.padding, self.padding)
+        with self.draw_lock:
+            pages.draw_page(painter, index)
+        painter.end()
+        return image
+
+    def _store(self, generation, index, image):
+        with self.lock:
+            if generation != self.generation:
+                return False
+            dropped = []
+            if index in self.frames:
+                dropped.append(self.frames.pop(index)[0])
+            key = next(self.serial)
+            self.frames[index] = (key, image)
+            while len(self.frames) > self.max_pages:
+                dropped.append(self.frames.popitem(last=False)[1][0])
+        self._release(dropped)
+        self._charge(index, key, image)
+        return True
+
+    def get(self, index):
+        """取得某页画面，未缓存时当场渲染"""
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+            else:
+                pages = self.pages
+                generation = self.generation
+        if frame is not None:
+            if self.memory is not None:
+                self.memory.touch('pages', frame[0])
+            return frame[1]
+        image = self.render(pages, index)
+        self._store(generation, index, image)
+        return image
+
+    def prefetch(self, index):
+        """后台预先渲染前后相邻页"""
+        with self.lock:
+            if self.pages is None:
+                return
+            targets = [i for i in (index + 1, index - 1)
+                       if 0 <= i < len(self.pages) and i not in self.frames and i not in self.pending]
+            self.pending.update(targets)
+            pages = self.pages
+            generation = self.generation
+        for i in targets:
+            self.executor.submit(self._prefetch, pages, generation, i)
+
+    def _prefetch(self, pages, generation, index):
+        with self.lock:
+            if generation != self.generation:
+                return
+        try:
+            image = self.render(pages, index)
+        except Exception as e:
+            print(f"预渲染第 {index + 1} 页失败: {str(e)}")
+            return
+        finally:
+            with self.lock:
+                self.pending.discard(index)
+        if self._store(generation, index, image) and self.on_ready:
+            self.on_ready(generation, index)
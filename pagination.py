@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_right
+import sys
+from PyQt6.QtGui import QTextDocument, QTextCursor, QFontMetricsF, QAbstractTextDocumentLayout, QPalette, QColor, QImage, QPixmap
+from PyQt6.QtCore import Qt, QRectF, QUrl
+
+# 排版后的文档平均每个字符占用的内存（文字、格式与行布局，实测约 32 字节）
+DOCUMENT_BYTES_PER_CHAR = 32
+
+def document_bytes(document, images=True):
+    """估算排版后的文档占用的内存：文字与行布局按字符数估算，图片按解码后的像素计算"""
+    size = document.characterCount() * DOCUMENT_BYTES_PER_CHAR
+    if not images:
+        return size
+    names = set()
+    block = document.begin()
+    while block.isValid():
+        fragments = block.begin()
+        while not fragments.atEnd():
+            char_format = fragments.fragment().charFormat()
+            if char_format.isImageFormat():
+                names.add(char_format.toImageFormat().name())
+            fragments += 1
+        block = block.next()
+    for name in names:
+        # 同一图片在文档中只解码一次
+        image = document.resource(QTextDocument.ResourceType.ImageResource.value, QUrl(name))
+        if isinstance(image, (QImage, QPixmap)):
+            size += image.width() * image.height() * 4
+    return size
+
+class Pagination:
+    """一次排版的分页结果：整篇文档及每页在文档中的纵向区间"""
+
+    def __init__(self, document, page_starts, page_tops, color='white', size=0):
+        self.document = document
+        self.page_starts = page_starts
+        self.page_tops = page_tops
+        self.color = QColor(color)
+        self.size = size
+
+    def __len__(self):
+        return len(self.page_tops)
+
+    def memory_size(self):
+        return self.size
+
+    def height(self):
+        return self.document.size().height()
+
+    def page_at(self, y):
+        """文档纵坐标 y 所在的页号"""
+        return max(0, bisect_right(self.page_tops, y) - 1)
+
+    def page_top(self, index):
+        return self.page_tops[index]
+
+    def page_rect(self, index):
+        """第 index 页在文档坐标中的区域"""
+        top = self.page_tops[index]
+        if index + 1 < len(self.page_tops):
+            bottom = self.page_tops[index + 1]
+        else:
+            bottom = self.height()
+        return QRectF(0, top, self.document.textWidth(), bottom - top)
+
+    def draw_page(self, painter, index):
+        """把第 index 页画到 painter 的 (0, 0) 处，不重新排版"""
+        rect = self.page_rect(index)
+        self.draw_region(painter, rect.top(), rect.height())
+
+    def draw_region(self, painter, top, height):
+        """把文档中从 top 起高 height 的一段连续区域画到 painter 的 (0, 0) 处，不按页截断"""
+        rect = QRectF(0, top, self.document.textWidth(), height)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.clip = rect
+        palette = QPalette()
+        palette.setColor(QPalette.ColorRole.Text, self.color)
+        context.palette = palette
+
+        painter.save()
+        painter.translate(0, -rect.top())
+        painter.setClipRect(rect)
+        self.document.documentLayout().draw(painter, context)
+        painter.restore()
+
+class TextPagination:
+    """纯文本分页结果：已折好的行，按固定行高逐行绘制"""
+
+    def __init__(self, lines, lines_per_page, line_height, font, width, color='white'):
+        self.lines = lines
+        self.lines_per_page = lines_per_page
+        self.line_height = line_height
+        self.font = font
+        self.width = width
+        self.color = QColor(color)
+
+    def __len__(self):
+        return max(1, (len(self.lines) + self.lines_per_page - 1) // self.lines_per_page)
+
+    def memory_size(self):
+        return sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+
+    def height(self):
+        return len(self.lines) * self.line_height
+
+    def page_at(self, y):
+        return min(len(self) - 1, max(0, int(y // (self.lines_per_page * self.line_height))))
+
+    def page_top(self, index):
+        return index * self.lines_per_page * self.line_height
+
+    def page_lines(self, index):
+        start = index * self.lines_per_page
+        return self.lines[start:start + self.lines_per_page]
+
+    def draw_page(self, painter, index):
+        painter.save()
+        painter.setFont(self.font)
+        painter.setPen(self.color)
+        for i, line in enumerate(self.page_lines(index)):
+            rect = QRectF(0, i * self.line_height, self.width, self.line_height)
+            painter.drawText(rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter | Qt.TextFlag.TextSingleLine, line)
+        painter.restore()
+
+    def draw_region(self, painter, top, height):
+        """不按页截断，画出从 top 起高 height 的连续区域，区域边缘的行只画出可见部分"""
+        first = max(0, int(top // self.line_height))
+        last = min(len(self.lines), int((top + height) // self.line_height) + 1)
+        painter.save()
+        painter.setClipRect(QRectF(0, 0, self.width, height))
+        painter.setFont(self.font)
+        painter.setPen(self.color)
+        for i in range(first, last):
+            rect = QRectF(0, i * self.line_height - top, self.width, self.line_height)
+            painter.drawText(rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter | Qt.TextFlag.TextSingleLine, self.lines[i])
+        painter.restore()
+
+class StreamPagination:
+    """追加显示的分页结果：由若干段独立排版的文档纵向拼接而成，追加内容时只需排版末尾一段"""
+
+    def __init__(self, width, color='white'):
+        self.width = width
+        self.color = QColor(color)
+        self.segments = []
+        self.tops = []
+        # 各段文档估算的内存占用，段在创建后不再修改
+        self.sizes = []
+        self.page_tops = [0.0]
+
+    def __len__(self):
+        return len(self.page_tops)
+
+    def memory_size(self):
+        return sum(self.sizes)
+
+    def height(self):
+        if not self.segments:
+            return 0.0
+        return self.tops[-1] + self.segments[-1].size().height()
+
+    def page_at(self, y):
+        return max(0, bisect_right(self.page_tops, y) - 1)
+
+    def page_top(self, index):
+        return self.page_tops[index]
+
+    def page_rect(self, index):
+        top = self.page_tops[index]
+        bottom = self.page_tops[index + 1] if index + 1 < len(self.page_tops) else self.height()
+        return QRectF(0, top, self.width, bottom - top)
+
+    def draw_page(self, painter, index):
+        if index >= len(self.page_tops):
+            # 末尾的内容刚被改写，页数变少了
+            return
+        rect = self.page_rect(index)
+        self.draw_region(painter, rect.top(), rect.height())
+
+    def draw_region(self, painter, top, height):
+        rect = QRectF(0, top, self.width, height)
+        palette = QPalette()
+        palette.setColor(QPalette.ColorRole.Text, self.color)
+        first = max(0, bisect_right(self.tops, rect.top()) - 1)
+        for document, top in zip(self.segments[first:], self.tops[first:]):
+            if top >= rect.bottom():
+                break
+            # 本页在该段文档坐标中的区域
+            clip = QRectF(0, rect.top() - top, self.width, rect.height())
+            context = QAbstractTextDocumentLayout.PaintContext()
+            context.clip = clip
+            context.palette = palette
+            painter.save()
+            painter.translate(0, top - rect.top())
+            painter.setClipRect(clip)
+            document.documentLayout().draw(painter, context)
+            painter.restore()
+
+class Paginator:
+    """一次排版、线性扫描行框确定分页位置"""
+
+    def __init__(self, font, page_width, page_height, color='white'):
+        self.font = font
+        self.page_width = page_width
+        self.page_height = page_height
+        self.color = color
+        self.metrics = QFontMetricsF(font)
+        self.advances = {}
+        self.line_height = None
+
+    def new_document(self):
+        document = QTextDocument()
+        document.setDefaultFont(self.font)
+        document.setDocumentMargin(0)
+        document.setTextWidth(self.page_width)
+        return document
+
+    def _units(self, document, offset=0.0):
+        """按文档顺序产生可分页单元 (字符位置, 顶部, 底部)，表格整体作为一个单元；offset 为文档顶部的纵坐标"""
+        layout = document.documentLayout()
+        last_table = None
+        bottom = offset
+        block = document.begin()
+        while block.isValid():
+            table = QTextCursor(block).currentTable()
+            if table is not None:
+                if table != last_table:
+                    last_table = table
+                    rect = layout.frameBoundingRect(table)
+                    top = max(rect.top() + offset, bottom)
+                    bottom = max(rect.bottom() + offset, top)
+                    yield table.firstPosition() - 1, top, bottom
+                block = block.next()
+                continue
+
+            block_top = layout.blockBoundingRect(block).top() + offset
+            text_layout = block.layout()
+            for i in range(text_layout.lineCount()):
+                line = text_layout.lineAt(i)
+                top = block_top + line.y()
+                if top + line.height() <= bottom:
+                    # 表格之后的空段落与表格重叠，不占高度
+                    continue
+                top = max(top, bottom)
+                bottom = top + line.height()
+                yield block.position() + line.textStart(), top, bottom
+            block = block.next()
+
+    @staticmethod
+    def add_resources(document, resources):
+        """把已解码的图片按地址注册到文档中，HTML 中的 <img src> 直接引用，不再经过 base64"""
+        for name, image in (resources or {}).items():
+            document.addResource(QTextDocument.ResourceType.ImageResource.value, QUrl(name), image)
+
+    def paginate_html(self, html, resources=None):
+        """排版一次 HTML 文档，在行/块边界处分页；resources 为 {地址: QImage}"""
+        document = self.new_document()
+        self.add_resources(document, resources)
+        document.setHtml(html)
+        # 触发一次完整排版
+        document.documentLayout().documentSize()
+
+        page_starts = [0]
+        page_tops = [0.0]
+        self._break_pages(self._units(document), page_tops, page_starts)
+        size = document_bytes(document, '<img' in html)
+        return Pagination(document, page_starts, page_tops, self.color, size)
+
+    def _break_pages(self, units, page_tops, page_starts=None):
+        """线性扫描可分页单元，单元超出当前页底部时从它的顶部开始新的一页"""
+        for position, top, bottom in units:
+            if bottom - page_tops[-1] > self.page_height and top > page_tops[-1]:
+                page_tops.append(top)
+                if page_starts is not None:
+                    page_starts.append(position)
+
+    def new_segment(self, html, resources=None):
+        """排版一段追加显示的 HTML"""
+        document = self.new_document()
+        self.add_resources(document, resources)
+        document.setHtml(html)
+        document.documentLayout().documentSize()
+        return document
+
+    def replace_segments(self, pages, start, documents):
+        """把 StreamPagination 第 start 段及之后的段换成 documents，只从受影响的页开始重新分页
+
+        返回第一个内容有变化的页号。
+        """
+        changed_top = pages.tops[start] if start < len(pages.tops) else pages.height()
+        del pages.segments[start:]
+        del pages.tops[start:]
+        del pages.sizes[start:]
+        for document in documents:
+            if pages.segments:
+                previous = pages.segments[-1]
+                # 段与段之间的间距按同一文档中相邻段落外边距合并的规则计算
+                gap = max(previous.lastBlock().blockFormat().bottomMargin(),
+                          document.begin().blockFormat().topMargin())
+                top = pages.tops[-1] + previous.size().height() + gap
+            else:
+                top = 0.0
+            pages.segments.append(document)
+            pages.tops.append(top)
+            pages.sizes.append(document_bytes(document))
+
+        # 变化处之前的分页位置不受影响，从变化处所在的页重新扫描
+        first_page = max(0, bisect_right(pages.page_tops, changed_top) - 1)
+        del pages.page_tops[first_page + 1:]
+        first_segment = max(0, bisect_right(pages.tops, pages.page_tops[-1]) - 1)
+        units = (unit for document, top in zip(pages.segments[first_segment:], pages.tops[first_segment:])
+                 for unit in self._units(document, top))
+        self._break_pages(units, pages.page_tops)
+        return first_page
+
+    def _advance(self, ch):
+        width = self.advances.get(ch)
+        if width is None:
+            width = self.metrics.horizontalAdvance(ch)
+            self.advances[ch] = width
+        return width
+
+    def _measure_line_height(self):
+        """实际排版一行的高度（包含回退字体，如中文）"""
+        if self.line_height is None:
+            document = self.new_document()
+            document.setPlainText('Ag中文')
+            self.line_height = document.documentLayout().documentSize().height()
+        return self.line_height
+
+    def wrap_text(self, text):
+        """根据字体宽度把一段文字折成若干行"""
+        max_width = self.page_width - 1
+        lines = []
+        start = 0
+        width = 0.0
+        last_space = -1
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            width += self._advance(ch)
+            if ch == ' ':
+                last_space = i
+            elif width > max_width and i > start:
+                if last_space >= start:
+                    # 在最近的空格处断行
+                    lines.append(text[start:last_space])
+                    start = last_space + 1
+                    width = sum(self._advance(c) for c in text[start:i + 1])
+                else:
+                    lines.append(text[start:i])
+                    start = i
+                    width = self._advance(ch)
+                last_space = -1
+            i += 1
+        lines.append(text[start:])
+        return lines
+
+    def paginate_text(self, text):
+        """纯文本快速分页：按字体度量折行并计算每页行数，不做排版；含 HTML 标记时返回 None"""
+        if '<' in text or '&' in text:
+            return None
+        lines = []
+        for paragraph in text.split('\n'):
+            lines.extend(self.wrap_text(paragraph))
+        return self.text_pagination(lines)
+
+    def text_pagination(self, lines):
+        """用已折好的行构造纯文本分页结果"""
+        line_height = self._measure_line_height()
+        lines_per_page = max(1, int(self.page_height // line_height))
+        return TextPagination(lines, lines_per_page, line_height, self.font, self.page_width, self.color)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+def item_key(content_type, content=None, asset=None):
+    """按内容计算条目的键，内容不变的条目在播放列表更新后沿用已渲染的结果"""
+    digest = hashlib.sha256(content_type.encode())
+    digest.update(b'\0')
+    if asset is not None:
+        digest.update(b'asset:' + asset.encode())
+    else:
+        digest.update(content.encode() if isinstance(content, str) else bytes(content))
+    return digest.hexdigest()[:16]
+
+class PlaylistItem:
+    def __init__(self, content, content_type, duration, asset=None):
+        self.content = content
+        self.content_type = content_type
+        self.duration = duration
+        self.asset = asset
+        self.key = item_key(content_type, content, asset)
+
+class Playlist:
+    """轮播列表：记录条目和各条目的预渲染结果
+
+    只预渲染当前条目之后的 lookahead 个条目，已渲染的结果按最久未使用淘汰，
+    最多保留 max_rendered 个。submit 为提交预渲染任务的回调，返回 RenderJob；
+    on_discard(job) 在已渲染的结果不再保留时回调（在持有锁时调用，不能再调用播放列表的方法）。
+    """
+
+    def __init__(self, submit, lookahead=2, max_rendered=8, on_discard=None):
+        self.submit = submit
+        self.lookahead = lookahead
+        self.max_rendered = max_rendered
+        self.on_discard = on_discard
+        self.items = []
+        self.loop = True
+        self.index = -1
+        self.rendered = OrderedDict()
+        self.rendering = {}
+        self.lock = threading.Lock()
+
+    def replace(self, items, loop=True):
+        """换上新的条目列表，内容未变的条目不重新渲染，返回变更统计"""
+        with self.lock:
+            old_keys = {item.key for item in self.items}
+            new_keys = {item.key for item in items}
+            current = self.items[self.index].key if 0 <= self.index < len(self.items) else None
+
+            for key in list(self.rendering):
+                if key not in new_keys:
+                    self.rendering.pop(key).cancelled = True
+            for key in list(self.rendered):
+                if key not in new_keys:
+                    self._discard(self.rendered.pop(key))
+
+            self.items = items
+            self.loop = loop
+            # 当前条目仍在列表中时从它的新位置继续轮播，否则从头开始
+            self.index = -1
+            if current in new_keys:
+                self.index = next(i for i, item in enumerate(items) if item.key == current)
+            self._prefetch()
+            return {
+                'added': len(new_keys - old_keys),
+                'kept': len(new_keys & old_keys),
+                'removed': len(old_keys - new_keys),
+                'current_kept': self.index >= 0
+            }
+
+    def _discard(self, job):
+        if self.on_discard is not None:
+            self.on_discard(job)
+
+    def forget(self, job):
+        """已渲染的结果被外部释放（如内存预算不足），之后需要时重新渲染"""
+        with self.lock:
+            key = next((k for k, rendered in self.rendered.items() if rendered is job), None)
+            if key is not None:
+                del self.rendered[key]
+
+    def clear(self):
+        self.replace([])
+
+    def is_empty(self):
+        with self.lock:
+            return not self.items
+
+    def _upcoming(self):
+        """当前条目之后需要预渲染的条目下标"""
+        count = len(self.items)
+        indexes = []
+        for step in range(1, self.lookahead + 1):
+            index = self.index + step
+            if index >= count:
+                if not self.loop:
+                    break
+                index %= count
+            if index not in indexes:
+                indexes.append(index)
+        return indexes
+
+    def _prefetch(self):
+        if not self.items:
+            return
+        for index in self._upcoming():
+            item = self.items[index]
+            if item.key in self.rendered or item.key in self.rendering:
+                continue
+            self.rendering[item.key] = self.submit(item)
+
+    def job_done(self, job):
+        """预渲染任务完成，返回对应条目的键，任务已作废时返回 None"""
+        with self.lock:
+            key = next((k for k, pending in self.rendering.items() if pending is job), None)
+            if key is None:
+                return None
+            del self.rendering[key]
+            self.rendered[key] = job
+            keep = {self.items[i].key for i in [self.index] + self._upcoming() if 0 <= i < len(self.items)}
+            for old in list(self.rendered):
+                if len(self.rendered) <= self.max_rendered:
+                    break
+                if old not in keep:
+                    self._discard(self.rendered.pop(old))
+            return key
+
+    def advance(self):
+        """切换到下一个条目，返回 (条目, 已渲染的任务或 None)；列表为空或播放结束时返回 None"""
+        with self.lock:
+            if not self.items:
+                return None
+            index = self.index + 1
+            if index >= len(self.items):
+                if not self.loop:
+                    return None
+                index = 0
+            self.index = index
+            item = self.items[index]
+            job = self.rendered.get(item.key)
+            if job is not None:
+                self.rendered.move_to_end(item.key)
+            elif item.key not in self.rendering:
+                self.rendering[item.key] = self.submit(item)
+            self._prefetch()
+            return item, job
+
+    def current(self):
+        with self.lock:
+            if 0 <= self.index < len(self.items):
+                return self.items[self.index]
+            return None
+
+    def status(self):
+        with self.lock:
+            items = []
+            for item in self.items:
+                if item.key in self.rendered:
+                    state = 'failed' if self.rendered[item.key].status == 'failed' else 'rendered'
+                elif item.key in self.rendering:
+                    state = 'rendering'
+                else:
+                    state = 'pending'
+                items.append({
+                    'key': item.key,
+                    'type': item.content_type,
+                    'duration': item.duration,
+                    'status': state
+                })
+            return {'loop': self.loop, 'current': self.index, 'items': items}
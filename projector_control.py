@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import time
+import socket
+import argparse
+
 try:
     from serial import Serial, SerialException
 except ImportError:
-    print("错误：请先安装 pyserial 库")
-    print("安装命令：pip install pyserial")
-    sys.exit(1)
-
-import sys
-import argparse
+    # 通过守护进程发送命令时不需要 pyserial
+    Serial = None
+    SerialException = OSError
 
 # 投影仪指令映射表
 COMMANDS = {
@@ -38,6 +41,10 @@ COMMANDS = {
     'phase_negative': 'U相位负向校正'
 }
 
+DEFAULT_SOCKET = os.environ.get('RPI_PROJECTOR_SOCKET', '/tmp/projector.sock')
+# 直接访问串口时两条命令之间的间隔（秒）
+COMMAND_INTERVAL = 0.1
+
 def send_command(port, command):
     """
     发送命令到投影仪
@@ -45,6 +52,9 @@ def send_command(port, command):
     Args:
         port: 串口对象
         command: 命令字符串
+    
+    Returns:
+        是否发送成功
     """
     try:
         # 将命令转换为GBK编码
@@ -54,29 +64,81 @@ def send_command(port, command):
         # 发送命令
         port.write(command_bytes)
         print(f"已发送命令: {command}")
+        return True
     except Exception as e:
         print(f"发送命令时出错: {str(e)}")
+        return False
+
+def send_via_daemon(socket_path, names):
+    """
+    通过投影仪守护进程发送命令：一次连接发出全部命令，再按顺序读取每条命令的结果
+    
+    Returns:
+        [(命令, 是否成功, 回复)]，无法连接守护进程时返回 None
+    """
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+    except OSError:
+        return None
+    with client:
+        client.sendall(''.join(f'{name}\n' for name in names).encode())
+        client.shutdown(socket.SHUT_WR)
+        replies = client.makefile('r', encoding='utf-8').read().splitlines()
+    results = []
+    for index, name in enumerate(names):
+        reply = replies[index] if index < len(replies) else f'ERR {name} no reply'
+        results.append((name, reply.startswith('OK '), reply))
+    return results
+
+def send_direct(port, baudrate, names):
+    """直接打开串口依次发送命令"""
+    if Serial is None:
+        print("错误：请先安装 pyserial 库")
+        print("安装命令：pip install pyserial")
+        return [(name, False, f'ERR {name} pyserial not installed') for name in names]
+    results = []
+    try:
+        # 打开串口
+        with Serial(port, baudrate, timeout=1) as ser:
+            for index, name in enumerate(names):
+                if index:
+                    ser.flush()
+                    time.sleep(COMMAND_INTERVAL)
+                ok = send_command(ser, COMMANDS[name])
+                results.append((name, ok, f'OK {name}' if ok else f'ERR {name} send failed'))
+    except SerialException as e:
+        print(f"串口错误: {str(e)}")
+    except Exception as e:
+        print(f"发生错误: {str(e)}")
+    done = len(results)
+    results.extend((name, False, f'ERR {name} not sent') for name in names[done:])
+    return results
 
 def main():
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='投影仪控制程序')
-    parser.add_argument('command', choices=COMMANDS.keys(), help='要执行的命令')
+    parser.add_argument('commands', nargs='+', choices=COMMANDS.keys(), metavar='command',
+                        help='要执行的命令，可一次给出多个，按顺序执行')
     parser.add_argument('--port', default='/dev/ttyUSB0', help='串口设备路径 (默认: /dev/ttyUSB0)')
     parser.add_argument('--baudrate', type=int, default=115200, help='串口波特率 (默认: 115200)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'投影仪守护进程的套接字 (默认: {DEFAULT_SOCKET})')
+    parser.add_argument('--direct', action='store_true', help='不使用守护进程，直接打开串口')
     
     args = parser.parse_args()
     
-    try:
-        # 打开串口
-        with Serial(args.port, args.baudrate, timeout=1) as ser:
-            # 获取对应的命令字符串
-            command_str = COMMANDS[args.command]
-            # 发送命令
-            send_command(ser, command_str)
-    except SerialException as e:
-        print(f"串口错误: {str(e)}")
-    except Exception as e:
-        print(f"发生错误: {str(e)}")
+    results = None
+    if not args.direct:
+        results = send_via_daemon(args.socket, args.commands)
+        if results is None:
+            print(f"未连接到投影仪守护进程 ({args.socket})，改为直接打开串口")
+    if results is None:
+        results = send_direct(args.port, args.baudrate, args.commands)
+    
+    for name, ok, reply in results:
+        print(reply)
+    # 有任何命令失败时以非零状态退出
+    sys.exit(0 if all(ok for _, ok, _ in results) else 1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -3,10 +3,31 @@
 
 import os
 import time
+import threading
+from collections import deque
+from concurrent.futures import Future
 from serial import Serial, SerialException
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import Qt, QObject, QTimer, pyqtSignal
+
+# 开关机命令只关心最终状态，排队中的旧命令可以被新命令取代
+POWER_COMMANDS = ('power_on', 'power_off')
+
+# 电源状态：启动时状态未知，开机后先预热，关机后先散热
+POWER_STATES = ('unknown', 'off', 'warming', 'on', 'cooling')
+
+class ProjectorController(QObject):
+    """投影仪控制器
+
+    电源由状态机管理：power_on/power_off 只记录期望状态，只有与当前状态不符时才发送串口命令，
+    预热和散热结束由单次定时器触发。活动时重新启动单次空闲定时器，超时后关机，
+    空闲时既没有定时唤醒也没有串口写入。公开方法可在任意线程调用，状态机在控制器所在线程中运行。
+    """
+
+    state_changed = pyqtSignal(str)
+    power_requested = pyqtSignal(str)  # 'on' 或 'off'
+    activity = pyqtSignal()
+    command_failed = pyqtSignal(str)
 
-class ProjectorController:
     # 投影仪指令映射表
     COMMANDS = {
         'power_on': '开机',
@@ -34,14 +55,44 @@ class ProjectorController:
         'phase_negative': 'U相位负向校正'
     }
 
-    def __init__(self, port='/dev/ttyUSB0', baudrate=115200):
+    def __init__(self, port='/dev/ttyUSB0', baudrate=115200, max_queue=32, min_interval=0.1,
+                 idle_timeout=30, warm_up=20, cool_down=30):
+        super().__init__()
         self.port = port
         self.baudrate = baudrate
         self.serial = None
         self.last_update_time = 0
-        self.power_off_timer = QTimer()
-        self.power_off_timer.timeout.connect(self.check_and_power_off)
-        self.power_off_timer.start(1000)  # 每秒检查一次
+        
+        # 电源状态机
+        self.state = 'unknown'
+        self.desired = None
+        self.state_since = time.time()
+        self.warm_up = warm_up
+        self.cool_down = cool_down
+        self.idle_timeout = idle_timeout
+        self.transition_timer = QTimer(self)
+        self.transition_timer.setSingleShot(True)
+        self.transition_timer.timeout.connect(self._transition_done)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setTimerType(Qt.TimerType.VeryCoarseTimer)
+        self.idle_timer.timeout.connect(self._idle_timeout)
+        self.power_requested.connect(self._request_power)
+        self.activity.connect(self._restart_idle_timer)
+        self.command_failed.connect(self._power_command_failed)
+        
+        # 串口读写全部在独立的工作线程中进行，调用方只负责排队
+        self.max_queue = max_queue
+        self.min_interval = min_interval  # 两条命令之间的最小间隔（秒），防止投影仪串口溢出
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.last_sent = 0
+        self.reconnect_delay = 1.0
+        self.next_connect = 0
+        self.stats_counts = {'sent': 0, 'failed': 0, 'coalesced': 0, 'dropped': 0}
+        self.worker = threading.Thread(target=self._worker, name='projector-serial', daemon=True)
+        self.worker.start()
         
         # 检查串口设备是否存在
         if not os.path.exists(self.port):
@@ -64,8 +115,11 @@ class ProjectorController:
         try:
             if self.serial and self.serial.is_open:
                 self.serial.close()
-            self.serial = Serial(self.port, self.baudrate, timeout=1)
+            self.serial = Serial(self.port, self.baudrate, timeout=1, write_timeout=1)
+            # 只在打开串口时清掉残留数据，之后每条命令不再清空缓冲区
+            self.serial.reset_input_buffer()
             print(f"成功连接到投影仪串口: {self.port}")
+            self.reconnect_delay = 1.0
             return True
         except SerialException as e:
             print(f"连接投影仪串口失败: {str(e)}")
@@ -74,132 +128,274 @@ class ProjectorController:
             print("2. 串口被其他程序占用")
             print("3. 串口权限不足")
             print("4. 串口设备未正确连接")
+            self.serial = None
+            # 连接失败后逐步拉长重试间隔，避免每条命令都去重新打开串口
+            self.next_connect = time.monotonic() + self.reconnect_delay
+            self.reconnect_delay = min(self.reconnect_delay * 2, 30.0)
             return False
-            
+    
+    def submit(self, name):
+        """把命令放入发送队列并立即返回 Future，结果为是否发送成功；队列已满时返回 None"""
+        command = self.COMMANDS[name]
+        with self.condition:
+            if name in POWER_COMMANDS:
+                for pending in list(self.queue):
+                    if pending[0] == name:
+                        # 同样的开关机命令已在排队，直接共用
+                        self.stats_counts['coalesced'] += 1
+                        return pending[2]
+                    if pending[0] in POWER_COMMANDS:
+                        # 相反的开关机命令还没发出，以后到的为准
+                        self.queue.remove(pending)
+                        pending[2].cancel()
+                        self.stats_counts['coalesced'] += 1
+            if len(self.queue) >= self.max_queue:
+                self.stats_counts['dropped'] += 1
+                print(f"投影仪命令队列已满，丢弃命令: {command}")
+                return None
+            future = Future()
+            self.queue.append((name, command, future))
+            self.condition.notify()
+            return future
+    
     def send_command(self, command):
+        """按命令名或命令字符串排队发送，不等待串口，返回是否已进入队列"""
+        name = command if command in self.COMMANDS else next(
+            (key for key, value in self.COMMANDS.items() if value == command), None)
+        if name is None:
+            print(f"未知的投影仪命令: {command}")
+            return False
+        return self.submit(name) is not None
+    
+    def _worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                name, command, future = self.queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            # 限速：与上一条命令至少间隔 min_interval
+            delay = self.last_sent + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            ok = self._write(command)
+            self.last_sent = time.monotonic()
+            with self.condition:
+                self.stats_counts['sent' if ok else 'failed'] += 1
+            future.set_result(ok)
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+    
+    def _write(self, command):
         if not self.serial or not self.serial.is_open:
-            if not self.connect():
+            if time.monotonic() < self.next_connect or not self.connect():
+                print(f"投影仪串口不可用，命令未发送: {command}")
                 return False
         try:
-            # 确保串口是打开的
-            if not self.serial.is_open:
-                self.serial.open()
-                
-            # 清空串口缓冲区
-            self.serial.reset_input_buffer()
-            self.serial.reset_output_buffer()
-            
             command_bytes = command.encode('gbk')
             command_bytes += b'\x0D\x0A'
             self.serial.write(command_bytes)
+            # 等数据真正发出后再计算下一条命令的间隔
+            self.serial.flush()
             print(f"已发送投影仪命令: {command}")
             return True
         except SerialException as e:
             print(f"发送投影仪命令失败: {str(e)}")
-            print("尝试重新连接串口...")
+            print("将在下一条命令时重新连接串口")
             self.serial = None
             return False
         except Exception as e:
             print(f"发送投影仪命令时发生未知错误: {str(e)}")
             return False
+    
+    def stats(self):
+        with self.condition:
+            return {'queued': len(self.queue), 'state': self.state, **self.stats_counts}
+    
+    def shutdown(self):
+        """停止工作线程，未发送的命令作废"""
+        self.idle_timer.stop()
+        self.transition_timer.stop()
+        with self.condition:
+            self.running = False
+            for _, _, future in self.queue:
+                future.cancel()
+            self.queue.clear()
+            self.condition.notify()
+        self.worker.join(timeout=2)
             
     def power_on(self):
-        print("尝试打开投影仪...")
-        return self.send_command(self.COMMANDS['power_on'])
+        """请求开机，已开机或正在预热时不发送命令"""
+        self.power_requested.emit('on')
+        return True
         
     def power_off(self):
-        print("尝试关闭投影仪...")
-        return self.send_command(self.COMMANDS['power_off'])
+        """请求关机，已关机或正在散热时不发送命令"""
+        self.power_requested.emit('off')
+        return True
+    
+    def _set_state(self, state):
+        self.state = state
+        self.state_since = time.time()
+        print(f"投影仪状态: {state}")
+        self.state_changed.emit(state)
+    
+    def _request_power(self, desired):
+        self.desired = desired
+        self._advance()
+    
+    def _advance(self):
+        """当前状态与期望状态不符且不在预热、散热过程中时发送开关机命令"""
+        if self.desired == 'on' and self.state in ('unknown', 'off'):
+            print("尝试打开投影仪...")
+            self._send_power('power_on')
+            self._set_state('warming')
+            self.transition_timer.start(int(self.warm_up * 1000))
+        elif self.desired == 'off' and self.state in ('unknown', 'on'):
+            print("尝试关闭投影仪...")
+            self.idle_timer.stop()
+            self._send_power('power_off')
+            self._set_state('cooling')
+            self.transition_timer.start(int(self.cool_down * 1000))
+    
+    def _send_power(self, name):
+        future = self.submit(name)
+        if future is None:
+            self.command_failed.emit(name)
+            return
+        # 串口线程发送失败时通过信号回到状态机所在线程
+        future.add_done_callback(
+            lambda f: None if f.cancelled() or f.result() else self.command_failed.emit(name))
+    
+    def _power_command_failed(self, name):
+        """开关机命令没有发出去，退回原状态，等下次请求再试"""
+        if name == 'power_on' and self.state == 'warming':
+            self.transition_timer.stop()
+            self._set_state('off')
+        elif name == 'power_off' and self.state == 'cooling':
+            self.transition_timer.stop()
+            self._set_state('on')
+    
+    def _transition_done(self):
+        # 预热或散热期间的新请求在此之后才处理
+        if self.state == 'warming':
+            self._set_state('on')
+        elif self.state == 'cooling':
+            self._set_state('off')
+        self._advance()
+    
+    def _restart_idle_timer(self):
+        if self.idle_timeout > 0 and self.state in ('warming', 'on'):
+            self.idle_timer.start(int(self.idle_timeout * 1000))
+    
+    def _idle_timeout(self):
+        print(f"检测到{self.idle_timeout}秒无活动，准备关闭投影仪...")
+        self.last_update_time = 0
+        self.power_off()
+    
+    def power_status(self):
+        """电源状态，可在任意线程调用"""
+        idle_remaining = None
+        if self.last_update_time and self.state in ('warming', 'on') and self.idle_timeout > 0:
+            idle_remaining = max(0.0, self.last_update_time + self.idle_timeout - time.time())
+        return {
+            'state': self.state,
+            'desired': self.desired,
+            'since': self.state_since,
+            'idle_timeout': self.idle_timeout,
+            'idle_remaining': idle_remaining,
+            'last_activity': self.last_update_time or None
+        }
         
     def flip_image(self):
         print("尝试翻转图像...")
-        return self.send_command(self.COMMANDS['flip'])
+        return self.send_command('flip')
         
     def brightness_up(self):
         print("尝试增加亮度...")
-        return self.send_command(self.COMMANDS['brightness_up'])
+        return self.send_command('brightness_up')
         
     def brightness_down(self):
         print("尝试减少亮度...")
-        return self.send_command(self.COMMANDS['brightness_down'])
+        return self.send_command('brightness_down')
         
     def contrast_up(self):
         print("尝试增加对比度...")
-        return self.send_command(self.COMMANDS['contrast_up'])
+        return self.send_command('contrast_up')
         
     def contrast_down(self):
         print("尝试减少对比度...")
-        return self.send_command(self.COMMANDS['contrast_down'])
+        return self.send_command('contrast_down')
         
     def sharpness_up(self):
         print("尝试增加锐度...")
-        return self.send_command(self.COMMANDS['sharpness_up'])
+        return self.send_command('sharpness_up')
         
     def sharpness_down(self):
         print("尝试减少锐度...")
-        return self.send_command(self.COMMANDS['sharpness_down'])
+        return self.send_command('sharpness_down')
         
     def hue_up(self):
         print("尝试增加色度...")
-        return self.send_command(self.COMMANDS['hue_up'])
+        return self.send_command('hue_up')
         
     def hue_down(self):
         print("尝试减少色度...")
-        return self.send_command(self.COMMANDS['hue_down'])
+        return self.send_command('hue_down')
         
     def saturation_up(self):
         print("尝试增加饱和度...")
-        return self.send_command(self.COMMANDS['saturation_up'])
+        return self.send_command('saturation_up')
         
     def saturation_down(self):
         print("尝试减少饱和度...")
-        return self.send_command(self.COMMANDS['saturation_down'])
+        return self.send_command('saturation_down')
         
     def keystone_vertical_up(self):
         print("尝试增加垂直梯形校正...")
-        return self.send_command(self.COMMANDS['keystone_vertical_up'])
+        return self.send_command('keystone_vertical_up')
         
     def keystone_vertical_down(self):
         print("尝试减少垂直梯形校正...")
-        return self.send_command(self.COMMANDS['keystone_vertical_down'])
+        return self.send_command('keystone_vertical_down')
         
     def keystone_horizontal_up(self):
         print("尝试增加水平梯形校正...")
-        return self.send_command(self.COMMANDS['keystone_horizontal_up'])
+        return self.send_command('keystone_horizontal_up')
         
     def keystone_horizontal_down(self):
         print("尝试减少水平梯形校正...")
-        return self.send_command(self.COMMANDS['keystone_horizontal_down'])
+        return self.send_command('keystone_horizontal_down')
         
     def light_axis_confirm(self):
         print("确认光轴调整...")
-        return self.send_command(self.COMMANDS['light_axis_confirm'])
+        return self.send_command('light_axis_confirm')
         
     def light_axis_positive(self):
         print("正向调整光轴...")
-        return self.send_command(self.COMMANDS['light_axis_positive'])
+        return self.send_command('light_axis_positive')
         
     def light_axis_negative(self):
         print("负向调整光轴...")
-        return self.send_command(self.COMMANDS['light_axis_negative'])
+        return self.send_command('light_axis_negative')
         
     def phase_exit(self):
         print("退出相位校正...")
-        return self.send_command(self.COMMANDS['phase_exit'])
+        return self.send_command('phase_exit')
         
     def phase_positive(self):
         print("正向校正相位...")
-        return self.send_command(self.COMMANDS['phase_positive'])
+        return self.send_command('phase_positive')
         
     def phase_negative(self):
         print("负向校正相位...")
-        return self.send_command(self.COMMANDS['phase_negative'])
+        return self.send_command('phase_negative')
         
     def update_last_activity(self):
+        """记录活动并重新开始空闲计时"""
         self.last_update_time = time.time()
-        
-    def check_and_power_off(self):
-        if self.last_update_time > 0 and time.time() - self.last_update_time > 30:
-            print("检测到30秒无活动，准备关闭投影仪...")
-            self.power_off()
-            self.last_update_time = 0 
\ No newline at end of file
+        self.activity.emit()
+ 
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+投影仪守护进程
+
+长期持有串口，在本地 Unix 套接字上接收命令。协议为逐行文本：
+客户端每行发送一个命令名（见 ProjectorController.COMMANDS），可以连续发送多行；
+守护进程按相同顺序每行回复一个结果：
+    OK <命令>
+    OK <命令> superseded      （开关机命令被同一队列中后到的相反命令取代）
+    ERR <命令> <原因>
+另有 stats 命令，回复 OK stats <JSON>。
+
+用法：
+    python projector_daemon.py --port /dev/ttyUSB0 --socket /tmp/projector.sock
+"""
+
+import os
+import sys
+import json
+import queue
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from concurrent.futures import CancelledError
+from PyQt6.QtCore import QCoreApplication, QSocketNotifier
+from projector_controller import ProjectorController
+
+DEFAULT_SOCKET = os.environ.get('RPI_PROJECTOR_SOCKET', '/tmp/projector.sock')
+# 每个连接最多等待结果的命令数，超出后暂停读取
+MAX_IN_FLIGHT = 64
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """一个客户端连接：读线程提交命令，写线程按顺序等待并回复结果"""
+
+    def handle(self):
+        results = queue.Queue(MAX_IN_FLIGHT)
+        writer = threading.Thread(target=self.write_results, args=(results,), daemon=True)
+        writer.start()
+        try:
+            for raw in self.rfile:
+                name = raw.decode('utf-8', 'replace').strip()
+                if name:
+                    results.put((name, self.submit(name)))
+        except OSError:
+            pass
+        finally:
+            results.put(None)
+            writer.join()
+
+    def submit(self, name):
+        """提交命令，返回 Future 或直接给出的回复"""
+        projector = self.server.projector
+        if name == 'stats':
+            return 'OK stats ' + json.dumps(projector.stats())
+        if name not in projector.COMMANDS:
+            return f'ERR {name} unknown command'
+        future = projector.submit(name)
+        if future is None:
+            return f'ERR {name} queue full'
+        return future
+
+    def write_results(self, results):
+        while True:
+            entry = results.get()
+            if entry is None:
+                break
+            name, result = entry
+            if isinstance(result, str):
+                line = result
+            else:
+                try:
+                    line = f'OK {name}' if result.result() else f'ERR {name} send failed'
+                except CancelledError:
+                    # 被后到的相反开关机命令取代，投影仪最终状态仍符合请求
+                    line = f'OK {name} superseded'
+            try:
+                self.wfile.write((line + '\n').encode())
+            except OSError:
+                pass
+
+class ProjectorDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, projector):
+        self.projector = projector
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, CommandHandler)
+        os.chmod(socket_path, 0o660)
+
+def main():
+    parser = argparse.ArgumentParser(description='投影仪守护进程')
+    parser.add_argument('--port', default='/dev/ttyUSB0', help='串口设备路径 (默认: /dev/ttyUSB0)')
+    parser.add_argument('--baudrate', type=int, default=115200, help='串口波特率 (默认: 115200)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Unix 套接字路径 (默认: {DEFAULT_SOCKET})')
+    args = parser.parse_args()
+
+    # ProjectorController 的定时器需要 Qt 事件循环
+    app = QCoreApplication(sys.argv)
+    projector = ProjectorController(args.port, args.baudrate)
+    server = ProjectorDaemon(args.socket, projector)
+    # poll_interval=None：没有连接时线程一直阻塞，不做周期性唤醒
+    server_thread = threading.Thread(target=server.serve_forever, args=(None,), daemon=True)
+    server_thread.start()
+    print(f"投影仪守护进程已启动，串口 {args.port}，套接字 {args.socket}")
+
+    def stop(signum, frame):
+        app.quit()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    # 信号到达时唤醒 Qt 事件循环，让 Python 信号处理器得以运行，空闲时不需要定时轮询
+    wakeup_read, wakeup_write = socket.socketpair()
+    wakeup_read.setblocking(False)
+    wakeup_write.setblocking(False)
+    signal.set_wakeup_fd(wakeup_write.fileno())
+    notifier = QSocketNotifier(wakeup_read.fileno(), QSocketNotifier.Type.Read)
+    notifier.activated.connect(lambda: wakeup_read.recv(64))
+
+    try:
+        app.exec()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        projector.shutdown()
+        print("投影仪守护进程已退出")
+
+if __name__ == '__main__':
+    main()
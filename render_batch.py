@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量预渲染
+
+在无显示器的环境中（QT_QPA_PLATFORM=offscreen）用与显示服务相同的流水线渲染整个目录的文档，
+多个进程并行，每页输出为一张整屏图片。公式轮廓写入显示服务的公式磁盘缓存，
+部署前跑一遍即可让显示服务不必再渲染这些公式；--store-assets 同时把图片存入资源库，
+之后可以按哈希显示。
+
+用法：
+    python render_batch.py docs/ --output rendered/
+    python render_batch.py docs/ notes.md --processes 4 --format jpeg --summary summary.json
+    python render_batch.py docs/ --store-assets
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+# 必须在导入 Qt 之前设置
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+FORMULA_CACHE_DIR = os.environ.get('RPI_DISPLAY_FORMULA_CACHE', os.path.expanduser('~/.cache/rpi-display/formulas'))
+ASSET_DIR = os.environ.get('RPI_DISPLAY_ASSET_DIR', os.path.expanduser('~/.cache/rpi-display/assets'))
+
+# 按扩展名判断内容类型
+CONTENT_TYPES = {
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.txt': 'text',
+    '.png': 'image',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.gif': 'image',
+    '.bmp': 'image',
+    '.webp': 'image'
+}
+
+# 工作进程内的 QGuiApplication 和渲染器，由 init_worker 创建
+_app = None
+_renderer = None
+_asset_store = None
+
+def find_documents(paths):
+    """展开目录，返回 [(文件路径, 输出用的相对路径, 内容类型)]，不认识的扩展名跳过"""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    content_type = CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+                    if content_type:
+                        documents.append((full, os.path.relpath(full, path), content_type))
+        else:
+            content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+            if content_type:
+                documents.append((path, os.path.basename(path), content_type))
+            else:
+                print(f"跳过无法识别类型的文件: {path}")
+    return documents
+
+def init_worker(formula_cache_dir, asset_dir, quiet):
+    """工作进程初始化：创建无窗口的 Qt 应用和渲染器"""
+    global _app, _renderer, _asset_store
+    if quiet:
+        # 渲染组件的逐条日志不输出，结果由主进程汇总
+        sys.stdout = open(os.devnull, 'w')
+    from PyQt6.QtGui import QGuiApplication
+    from headless import HeadlessRenderer
+    _app = QGuiApplication([])
+    if asset_dir:
+        from asset_store import AssetStore
+        _asset_store = AssetStore(asset_dir)
+    # 并行在进程之间进行，公式在各进程内直接渲染
+    _renderer = HeadlessRenderer(formula_cache_dir or None, formula_workers=0)
+
+def render_document(path, relative, content_type, output_dir, fmt, quality):
+    """在工作进程中渲染一个文件，返回结果摘要"""
+    from screenshot import FORMATS
+    result = {'file': path, 'type': content_type}
+    start = time.perf_counter()
+    try:
+        if content_type == 'image':
+            with open(path, 'rb') as f:
+                content = f.read()
+            if _asset_store is not None:
+                result['asset'] = _asset_store.put(content)
+        else:
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+        job, page_count, frames = _renderer.render(content, content_type)
+        result['pages'] = page_count
+        result['timings'] = job.to_dict()['timings']
+        if output_dir:
+            target = os.path.join(output_dir, os.path.splitext(relative)[0])
+            os.makedirs(target, exist_ok=True)
+            extension = 'jpg' if FORMATS[fmt][0] == 'JPEG' else fmt
+            result['outputs'] = []
+            for index, frame in enumerate(frames):
+                file_name = os.path.join(target, f'page-{index + 1:03d}.{extension}')
+                if not frame.save(file_name, FORMATS[fmt][0], quality):
+                    raise Exception(f"图片保存失败: {file_name}")
+                result['outputs'].append(file_name)
+        job.release()
+        result['status'] = 'rendered'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def render_task(task):
+    return render_document(*task)
+
+def main():
+    parser = argparse.ArgumentParser(description='批量预渲染文档并填充渲染缓存')
+    parser.add_argument('paths', nargs='+', help='要渲染的文件或目录（.md/.markdown/.txt 及常见图片格式）')
+    parser.add_argument('--output', help='页面图片输出目录，不给出时只渲染、填充缓存')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='并行进程数 (默认: CPU 核心数)')
+    parser.add_argument('--format', default='png', choices=['png', 'jpeg'], help='页面图片格式 (默认: png)')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG 质量 (默认: 85)')
+    parser.add_argument('--formula-cache', default=FORMULA_CACHE_DIR, help='公式磁盘缓存目录 (默认与显示服务相同)')
+    parser.add_argument('--store-assets', action='store_true', help='同时把图片存入显示服务的资源库')
+    parser.add_argument('--summary', help='结果摘要输出的 JSON 文件')
+    parser.add_argument('--verbose', action='store_true', help='输出渲染组件的日志')
+    args = parser.parse_args()
+
+    documents = find_documents(args.paths)
+    if not documents:
+        print("没有找到可渲染的文件")
+        sys.exit(1)
+    quality = min(100, max(1, args.quality)) if args.format == 'jpeg' else -1
+    processes = max(1, min(args.processes, len(documents)))
+    asset_dir = ASSET_DIR if args.store_assets else None
+
+    start = time.perf_counter()
+    results = []
+    # Qt 不能在 fork 出的子进程中继续使用，工作进程以 spawn 方式启动
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, init_worker, (args.formula_cache, asset_dir, not args.verbose)) as pool:
+        tasks = [(path, relative, content_type, args.output, args.format, quality)
+                 for path, relative, content_type in documents]
+        # 先完成的先输出；文件大小差别很大时每次只分一个文件，避免某个进程积压
+        for result in pool.imap_unordered(render_task, tasks):
+            results.append(result)
+            if result['status'] == 'failed':
+                print(f"渲染失败 {result['file']}: {result['error']}")
+            else:
+                print(f"{result['file']}: {result['pages']} 页，{result['seconds'] * 1000:.0f}ms")
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    pages = sum(result.get('pages', 0) for result in results)
+    print(f"共 {len(results)} 个文件、{pages} 页，失败 {failed} 个，{processes} 个进程耗时 {elapsed:.2f}s")
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'processes': processes, 'seconds': round(elapsed, 3), 'pages': pages,
+                       'failed': failed, 'documents': results}, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import uuid
+import queue
+import itertools
+import threading
+from collections import OrderedDict
+
+# 优先级类别，数值越小越先渲染
+PRIORITIES = {'urgent': 0, 'normal': 1, 'low': 2}
+# 未显示就被丢弃的任务状态：尚未开始渲染时被取代为 superseded，渲染中途被取消为 cancelled
+DROPPED_STATUSES = ('superseded', 'cancelled')
+
+class RenderJob:
+    """一次显示请求及其渲染结果"""
+
+    def __init__(self, content, content_type, asset=None, priority='normal', prerender=False, preview=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.content = content
+        self.content_type = content_type
+        self.asset = asset
+        self.priority = priority
+        # 预渲染任务（如播放列表条目）渲染完成后不直接显示，也不参与合并
+        self.prerender = prerender
+        # 预览任务（如 /render）只取渲染结果，不显示，同样不参与合并
+        self.preview = preview
+        self.status = 'queued'
+        # 被更新的内容取代后置位，各阶段在适当时机检查并提前结束
+        self.cancelled = False
+        self.error = None
+        self.timings = {}
+        self.created_at = time.time()
+        self.rendered_at = None
+        self.shown_at = None
+        # 显示时从该页开始，恢复重启前的状态时使用
+        self.start_page = 0
+
+        # 各阶段的中间结果
+        self.html = None
+        # 公式图片 {资源地址: QImage}，排版时注册到文档中
+        self.resources = None
+        self.image = None
+        self.pixmap = None
+        self.pages = None
+        self.first_frame = None
+        # 内存预算不足时释放了原始内容和渲染结果
+        self.released = False
+        # 渲染结束（完成、失败或被取代）后置位，供等待结果的线程使用
+        self.finished = threading.Event()
+
+    def memory_size(self):
+        """估算原始内容和各阶段结果占用的字节数"""
+        size = 0
+        for value in (self.content, self.html):
+            if value is not None:
+                size += sys.getsizeof(value)
+        for image in (self.image, self.first_frame):
+            if image is not None:
+                size += image.sizeInBytes()
+        if self.pixmap is not None:
+            # 与资源库共用的画面两边都计入，宁可多算
+            size += self.pixmap.width() * self.pixmap.height() * 4
+        if self.pages is not None:
+            size += self.pages.memory_size()
+        return size
+
+    def release(self):
+        """释放原始内容和渲染结果，只保留状态与耗时记录"""
+        self.content = None
+        self.html = None
+        self.resources = None
+        self.image = None
+        self.pixmap = None
+        self.pages = None
+        self.first_frame = None
+        self.released = True
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'type': self.content_type,
+            'asset': self.asset,
+            'priority': self.priority,
+            'prerender': self.prerender,
+            'preview': self.preview,
+            'status': self.status,
+            'error': self.error,
+            'timings': {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()},
+            'created_at': self.created_at,
+            'rendered_at': self.rendered_at,
+            'shown_at': self.shown_at,
+            'released': self.released
+        }
+
+class RenderPipeline:
+    """多阶段渲染流水线，每个阶段一个工作线程，阶段之间通过优先队列传递任务
+
+    coalesce 为真时后到的更新取代优先级相同或更低、尚未显示的任务（后到者胜出），
+    cancel_running 为真时连正在渲染的任务也一并取消，否则只丢弃还没开始渲染的任务。
+    """
+
+    def __init__(self, stages, on_finished, history=100, coalesce=True, cancel_running=True):
+        self.stages = stages
+        self.on_finished = on_finished
+        self.history = history
+        self.coalesce = coalesce
+        self.cancel_running = cancel_running
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.active = set()
+        self.dropped = {status: 0 for status in DROPPED_STATUSES}
+        self.sequence = itertools.count()
+        self.queues = [queue.PriorityQueue() for _ in stages]
+        self.threads = []
+        for index, (name, _) in enumerate(stages):
+            thread = threading.Thread(target=self._worker, args=(index,), name=f'render-{name}')
+            thread.daemon = True
+            self.threads.append(thread)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        for q in self.queues:
+            q.put((-1, next(self.sequence), None))
+
+    def _put(self, index, job):
+        # 同一优先级内按提交顺序处理
+        self.queues[index].put((PRIORITIES[job.priority], next(self.sequence), job))
+
+    def submit(self, content, content_type, asset=None, priority='normal', prerender=False, preview=False):
+        """提交任务，立即返回 RenderJob"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的优先级: {priority}")
+        job = RenderJob(content, content_type, asset, priority, prerender, preview)
+        rank = PRIORITIES[priority]
+        with self.lock:
+            if self.coalesce and not prerender and not preview:
+                for other in self.active:
+                    if other.prerender or other.preview:
+                        continue
+                    if PRIORITIES[other.priority] >= rank and (self.cancel_running or other.status == 'queued'):
+                        other.cancelled = True
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.history:
+                self.jobs.popitem(last=False)
+            self.active.add(job)
+        self._put(0, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def pending(self):
+        """排队中或正在渲染、且没有被取代的任务数"""
+        with self.lock:
+            return sum(1 for job in self.active if not job.cancelled)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': sum(1 for job in self.active if not job.cancelled),
+                'coalesce': self.coalesce,
+                'cancel_running': self.cancel_running,
+                **self.dropped
+            }
+
+    def _finish(self, job, dropped=None):
+        if dropped is not None:
+            job.status = dropped
+        else:
+            if job.status != 'failed':
+                job.status = 'rendered'
+            job.rendered_at = time.time()
+        with self.lock:
+            self.active.discard(job)
+            if dropped is not None:
+                self.dropped[dropped] += 1
+        self.on_finished(job)
+        job.finished.set()
+
+    def _worker(self, index):
+        name, func = self.stages[index]
+        while True:
+            _, _, job = self.queues[index].get()
+            if job is None:
+                break
+            if job.cancelled:
+                self._finish(job, 'superseded' if job.status == 'queued' else 'cancelled')
+                continue
+            if job.status != 'failed':
+                job.status = name
+                start = time.perf_counter()
+                try:
+                    func(job)
+                except Exception as e:
+                    job.status = 'failed'
+                    job.error = str(e)
+                job.timings[name] = time.perf_counter() - start
+                if job.cancelled:
+                    self._finish(job, 'cancelled')
+                    continue
+
+            if index + 1 < len(self.stages):
+                self._put(index + 1, job)
+            else:
+                self._finish(job)
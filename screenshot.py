@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice
+
+FORMATS = {'png': ('PNG', 'image/png'), 'jpeg': ('JPEG', 'image/jpeg'), 'jpg': ('JPEG', 'image/jpeg')}
+
+def encode_image(image, fmt, quality=-1):
+    """把 QImage 编码为 PNG 或 JPEG 字节"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(buffer, FORMATS[fmt][0], quality):
+        raise Exception(f"图片编码失败: {fmt}")
+    buffer.close()
+    return bytes(data)
+
+class ScreenshotCache:
+    """当前画面的编码结果缓存
+
+    画面在换内容或翻页时版本号加一；同一版本、同一格式只编码一次，
+    并发请求等待同一次编码的结果。grab 回调返回 (版本号, QImage)。
+    """
+
+    def __init__(self, grab):
+        self.grab = grab
+        self.lock = threading.Lock()
+        self.version = None
+        self.encoded = {}
+        self.encode_locks = {}
+        self.hits = 0
+        self.encodes = 0
+
+    def get(self, current_version, fmt, quality=-1):
+        """返回 (版本号, 编码后的字节)"""
+        key = (fmt, quality)
+        with self.lock:
+            if self.version == current_version and key in self.encoded:
+                self.hits += 1
+                return self.version, self.encoded[key]
+            encode_lock = self.encode_locks.setdefault(key, threading.Lock())
+        with encode_lock:
+            # 等锁期间其他请求可能已经编码好了
+            with self.lock:
+                if self.version == current_version and key in self.encoded:
+                    self.hits += 1
+                    return self.version, self.encoded[key]
+            version, image = self.grab()
+            data = encode_image(image, fmt, quality)
+            with self.lock:
+                if version != self.version:
+                    self.version = version
+                    self.encoded = {}
+                self.encoded[key] = data
+                self.encodes += 1
+            return version, data
+
+    def stats(self):
+        with self.lock:
+            return {'version': self.version, 'cached': len(self.encoded), 'hits': self.hits, 'encodes': self.encodes}
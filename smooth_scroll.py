@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import time
+import threading
+from collections import deque
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtGui import QImage, QPixmap, QPainter
+from PyQt6.QtCore import Qt
+
+# 图块高度：屏幕宽、512 像素高的图块约 1.4MB，一屏涉及四到五块
+TILE_HEIGHT = 512
+# 帧间隔超过目标间隔的倍数时计为掉帧
+LATE_FACTOR = 1.5
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class FrameStats:
+    """滚动显示的帧间隔与绘制耗时统计，保留最近 window 帧"""
+
+    def __init__(self, window=600, on_frame=None):
+        self.window = window
+        self.on_frame = on_frame
+        self.lock = threading.Lock()
+        self.reset(1 / 60)
+
+    def reset(self, target_interval):
+        with self.lock:
+            self.target = target_interval
+            self.intervals = deque(maxlen=self.window)
+            self.paint_times = deque(maxlen=self.window)
+            self.frames = 0
+            self.late = 0
+            self.last = None
+
+    def record(self, now, paint_seconds):
+        """记录一帧：now 为这一帧开始绘制的时刻"""
+        with self.lock:
+            self.frames += 1
+            self.paint_times.append(paint_seconds)
+            interval = None
+            if self.last is not None:
+                interval = now - self.last
+                self.intervals.append(interval)
+                if interval > self.target * LATE_FACTOR:
+                    self.late += 1
+            self.last = now
+        if interval is not None and self.on_frame is not None:
+            self.on_frame(interval)
+
+    def summary(self):
+        with self.lock:
+            intervals = list(self.intervals)
+            paint_times = list(self.paint_times)
+            frames = self.frames
+            late = self.late
+            target = self.target
+        total = sum(intervals)
+        return {
+            'frames': frames,
+            'target_fps': round(1 / target, 2),
+            'fps': round(len(intervals) / total, 2) if total else 0.0,
+            'late': late,
+            'interval_ms': {
+                'p50': round(percentile(intervals, 0.5) * 1000, 2),
+                'p95': round(percentile(intervals, 0.95) * 1000, 2),
+                'p99': round(percentile(intervals, 0.99) * 1000, 2),
+                'max': round(max(intervals, default=0.0) * 1000, 2)
+            },
+            'paint_ms': {
+                'p50': round(percentile(paint_times, 0.5) * 1000, 3),
+                'p95': round(percentile(paint_times, 0.95) * 1000, 3),
+                'max': round(max(paint_times, default=0.0) * 1000, 3)
+            }
+        }
+
+class ScrollTiles:
+    """把整篇文档连续画在一个高长的平面上，按固定高度分块
+
+    图块在后台线程中画成 QImage，在 GUI 线程中转换为 QPixmap，之后每帧只贴图。
+    平面左右和上下各留 padding 的边距；draw_lock 为绘制同一份文档时持有的锁。
+    executor 使用页面缓存的预取线程：Qt 的字体缓存属于线程，文档的排版结果会引用绘制线程中的字体，
+    为每次滚动单独开线程，线程结束后再绘制同一份文档会访问已释放的字体。
+    """
+
+    def __init__(self, pages, width, padding, draw_lock, executor, tile_height=TILE_HEIGHT):
+        self.pages = pages
+        self.width = width
+        self.padding = padding
+        self.draw_lock = draw_lock
+        self.tile_height = tile_height
+        self.height = math.ceil(pages.height()) + padding * 2
+        self.count = max(1, math.ceil(self.height / tile_height))
+        self.lock = threading.Lock()
+        # 已画好、尚未转换的图块；pixmaps 只在 GUI 线程中访问
+        self.images = {}
+        # 图块号 -> 尚未完成的 Future
+        self.pending = {}
+        self.pixmaps = {}
+        self.misses = 0
+        self.closed = False
+        self.executor = executor
+
+    def render(self, index):
+        """把第 index 块画成 QImage"""
+        image = QImage(self.width, self.tile_height, QImage.Format.Format_RGB32)
+        image.fill(Qt.GlobalColor.black)
+        painter = QPainter(image)
+        top = index * self.tile_height - self.padding
+        painter.translate(self.padding, 0)
+        with self.draw_lock:
+            self.pages.draw_region(painter, top, self.tile_height)
+        painter.end()
+        return image
+
+    def _render(self, index):
+        try:
+            image = self.render(index)
+        except Exception as e:
+            print(f"滚动图块 {index} 渲染失败: {str(e)}")
+            image = None
+        with self.lock:
+            self.pending.pop(index, None)
+            if image is not None and not self.closed:
+                self.images[index] = image
+
+    def prefetch(self, first, last):
+        """后台画好 first 到 last 块中还没有的图块"""
+        with self.lock:
+            if self.closed:
+                return
+            for index in range(max(0, first), min(self.count, last + 1)):
+                if index not in self.pixmaps and index not in self.images and index not in self.pending:
+                    self.pending[index] = self.executor.submit(self._render, index)
+
+    def upload(self, limit=1):
+        """在 GUI 线程中把最多 limit 块已画好的图块转换为 QPixmap，分摊到多帧；返回转换的块数"""
+        with self.lock:
+            ready = sorted(self.images)[:limit]
+            images = [(index, self.images.pop(index)) for index in ready]
+        for index, image in images:
+            self.pixmaps[index] = QPixmap.fromImage(image)
+        return len(images)
+
+    def pixmap(self, index):
+        """取得图块的 QPixmap，还没画好时当场绘制"""
+        pixmap = self.pixmaps.get(index)
+        if pixmap is not None:
+            return pixmap
+        with self.lock:
+            image = self.images.pop(index, None)
+        if image is None:
+            self.misses += 1
+            image = self.render(index)
+        pixmap = self.pixmaps[index] = QPixmap.fromImage(image)
+        return pixmap
+
+    def retain(self, first, last):
+        """只保留 first 到 last 块，返回是否丢弃了图块"""
+        dropped = [index for index in self.pixmaps if index < first or index > last]
+        for index in dropped:
+            del self.pixmaps[index]
+        with self.lock:
+            for index in [index for index in self.images if index < first or index > last]:
+                del self.images[index]
+        return bool(dropped)
+
+    def memory_size(self):
+        with self.lock:
+            count = len(self.pixmaps) + len(self.images)
+        return count * self.width * self.tile_height * 4
+
+    def shutdown(self):
+        """释放图块，取消还没开始的绘制；线程属于页面缓存，不在这里结束"""
+        with self.lock:
+            self.closed = True
+            self.images.clear()
+            futures = list(self.pending.values())
+        for future in futures:
+            future.cancel()
+        self.pixmaps.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'height': self.height, 'tiles': self.count, 'tile_height': self.tile_height,
+                    'cached': len(self.pixmaps) + len(self.images), 'misses': self.misses}
+
+class ScrollView(QWidget):
+    """平滑滚动的显示区域：每帧只把可见区域涉及的图块贴到屏幕上，不重新排版也不重画文字"""
+
+    def __init__(self, stats, view_width, view_height):
+        super().__init__()
+        self.stats = stats
+        self.view_width = view_width
+        self.view_height = view_height
+        self.tiles = None
+        self.offset = 0
+        # 每帧都会完整覆盖，不需要先填充背景
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+    def visible_tiles(self, offset=None):
+        """可见区域涉及的第一块和最后一块"""
+        if offset is None:
+            offset = self.offset
+        height = self.tiles.tile_height
+        return offset // height, (offset + self.view_height - 1) // height
+
+    def draw(self, painter):
+        if self.tiles is None:
+            painter.fillRect(0, 0, self.view_width, self.view_height, Qt.GlobalColor.black)
+            return
+        first, last = self.visible_tiles()
+        for index in range(first, last + 1):
+            y = index * self.tiles.tile_height - self.offset
+            if index < self.tiles.count:
+                painter.drawPixmap(0, y, self.tiles.pixmap(index))
+            else:
+                painter.fillRect(0, y, self.view_width, self.tiles.tile_height, Qt.GlobalColor.black)
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        self.draw(painter)
+        if self.width() > self.view_width:
+            # 窗口比画面宽时（如没有按屏幕尺寸运行），多出的部分不会被图块覆盖
+            painter.fillRect(self.view_width, 0, self.width() - self.view_width, self.height(), Qt.GlobalColor.black)
+        painter.end()
+        self.stats.record(start, time.perf_counter() - start)
+
+    def frame(self):
+        """当前画面的 QImage，直接由图块合成，不经过 paintEvent，不计入帧统计"""
+        image = QImage(self.view_width, self.view_height, QImage.Format.Format_RGB32)
+        painter = QPainter(image)
+        self.draw(painter)
+        painter.end()
+        return image
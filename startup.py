@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+
+def process_age():
+    """进程已运行的秒数（从 /proc 读取，精度为一个时钟节拍），无法获取时返回 None"""
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        # 第二个字段是进程名，可能含空格，从右括号之后开始数；启动时刻为第 22 个字段
+        start_ticks = int(stat[stat.rindex(')') + 2:].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# 本模块应最先导入，此时解释器已启动、第三方模块尚未导入
+_age = process_age()
+IMPORTED_AT = time.monotonic()
+ORIGIN = IMPORTED_AT - (_age or 0.0)
+
+class StartupTimer:
+    """记录启动各阶段完成的时刻，以进程启动为零点
+
+    同名阶段只记录第一次。warm_up 记录后台预热中各项的耗时。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.marks = {}
+        self.warm_up = {}
+        if _age is not None:
+            self.marks['interpreter'] = IMPORTED_AT - ORIGIN
+        self.mark('imports')
+
+    def mark(self, name):
+        """记录阶段完成的时刻，第一次记录时返回 True"""
+        with self.lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = time.monotonic() - ORIGIN
+            return True
+
+    def record_warm_up(self, name, seconds):
+        with self.lock:
+            self.warm_up[name] = seconds
+
+    def report(self):
+        with self.lock:
+            return {
+                'process_start_known': _age is not None,
+                'uptime': round(time.monotonic() - ORIGIN, 3),
+                'marks': {name: round(seconds * 1000, 1) for name, seconds in self.marks.items()},
+                'warm_up': {name: round(seconds * 1000, 1) for name, seconds in self.warm_up.items()}
+            }
+
+    def summary(self):
+        with self.lock:
+            return '，'.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.marks.items())
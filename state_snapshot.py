@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+from PyQt6.QtGui import QImage
+
+# 文件头：标识、格式版本、元数据长度、内容长度；画面数据按页对齐，可以直接映射使用
+MAGIC = b'RPDS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIII')
+FRAME_ALIGN = 4096
+FRAME_FORMAT = QImage.Format.Format_RGB32
+
+def save_snapshot(path, meta, content, frame):
+    """原子地写入快照：先写临时文件并刷到磁盘，再替换旧文件，断电时只会留下完整的新快照或旧快照
+
+    meta 为可序列化为 JSON 的字典，content 为文本或字节（可为 None），frame 为当前画面的 QImage。
+    """
+    if frame.format() != FRAME_FORMAT:
+        frame = frame.convertToFormat(FRAME_FORMAT)
+    content_is_text = isinstance(content, str)
+    if content_is_text:
+        content = content.encode('utf-8')
+    content = content or b''
+    meta = dict(meta, width=frame.width(), height=frame.height(), stride=frame.bytesPerLine(),
+                content_is_text=content_is_text)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    head = HEADER.pack(MAGIC, FORMAT_VERSION, len(meta_bytes), len(content))
+    offset = HEADER.size + len(meta_bytes) + len(content)
+    padding = -offset % FRAME_ALIGN
+    bits = frame.constBits()
+    bits.setsize(frame.sizeInBytes())
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(head)
+            f.write(meta_bytes)
+            f.write(content)
+            f.write(b'\0' * padding)
+            f.write(memoryview(bits))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # 目录项也刷到磁盘，替换本身才不会因断电丢失
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return offset + padding + frame.sizeInBytes()
+
+class Snapshot:
+    """映射到内存的快照，画面直接引用映射的数据，不复制；用完后调用 close()"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = None
+        try:
+            magic, version, meta_length, content_length = HEADER.unpack_from(self.map)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"快照格式不符: {magic!r} 版本 {version}")
+            start = HEADER.size
+            self.meta = json.loads(self.map[start:start + meta_length].decode('utf-8'))
+            start += meta_length
+            content = self.map[start:start + content_length]
+            if self.meta.get('content_is_text'):
+                content = content.decode('utf-8')
+            self.content = content if content_length else None
+            start += content_length
+            self.frame_offset = start + (-start % FRAME_ALIGN)
+            self.frame_size = self.meta['stride'] * self.meta['height']
+            if self.frame_offset + self.frame_size > len(self.map):
+                raise ValueError("快照画面数据不完整")
+        except BaseException:
+            self.map.close()
+            raise
+
+    def frame(self):
+        """返回直接引用映射数据的 QImage，只能在 close() 之前使用"""
+        self.view = memoryview(self.map)[self.frame_offset:self.frame_offset + self.frame_size]
+        return QImage(self.view, self.meta['width'], self.meta['height'], self.meta['stride'], FRAME_FORMAT)
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        self.map.close()
@@ -5,17 +5,34 @@ import time
 # 测试服务器地址
 SERVER_URL = "http://localhost:5000"
 
+# 测试公式，benchmark.py 也使用这些公式作为基准语料
+SIMPLE_FORMULAS = [
+    "E = mc^2",
+    "x^2 + y^2 = r^2",
+    "\\frac{1}{2}",
+    "\\sqrt{2}",
+    "\\sum_{i=1}^{n} i"
+]
+
+COMPLEX_FORMULAS = [
+    "\\int_{a}^{b} f(x) dx",
+    "\\frac{\\partial f}{\\partial x}",
+    "\\begin{pmatrix} a & b \\\\ c & d \\end{pmatrix}",
+    "\\lim_{x \\to \\infty} \\frac{1}{x} = 0",
+    "\\sum_{n=1}^{\\infty} \\frac{1}{n^2} = \\frac{\\pi^2}{6}"
+]
+
+SPECIAL_FORMULAS = [
+    "\\alpha \\beta \\gamma",
+    "\\mathbb{R} \\mathbb{C}",
+    "\\mathcal{L} \\mathcal{H}",
+    "\\vec{v} \\cdot \\vec{w}",
+    "\\hat{x} \\bar{y}"
+]
+
 def test_simple_formulas():
     """测试简单公式"""
-    formulas = [
-        "E = mc^2",
-        "x^2 + y^2 = r^2",
-        "\\frac{1}{2}",
-        "\\sqrt{2}",
-        "\\sum_{i=1}^{n} i"
-    ]
-    
-    for formula in formulas:
+    for formula in SIMPLE_FORMULAS:
         print(f"\n测试公式: {formula}")
         markdown_content = f"行内公式: ${formula}$\n\n块级公式:\n$${formula}$$"
         
@@ -34,15 +51,7 @@ def test_simple_formulas():
 
 def test_complex_formulas():
     """测试复杂公式"""
-    complex_formulas = [
-        "\\int_{a}^{b} f(x) dx",
-        "\\frac{\\partial f}{\\partial x}",
-        "\\begin{pmatrix} a & b \\\\ c & d \\end{pmatrix}",
-        "\\lim_{x \\to \\infty} \\frac{1}{x} = 0",
-        "\\sum_{n=1}^{\\infty} \\frac{1}{n^2} = \\frac{\\pi^2}{6}"
-    ]
-    
-    for formula in complex_formulas:
+    for formula in COMPLEX_FORMULAS:
         print(f"\n测试复杂公式: {formula}")
         markdown_content = f"行内公式: ${formula}$\n\n块级公式:\n$${formula}$$"
         
@@ -61,15 +70,7 @@ def test_complex_formulas():
 
 def test_special_characters():
     """测试特殊字符"""
-    special_formulas = [
-        "\\alpha \\beta \\gamma",
-        "\\mathbb{R} \\mathbb{C}",
-        "\\mathcal{L} \\mathcal{H}",
-        "\\vec{v} \\cdot \\vec{w}",
-        "\\hat{x} \\bar{y}"
-    ]
-    
-    for formula in special_formulas:
+    for formula in SPECIAL_FORMULAS:
         print(f"\n测试特殊字符: {formula}")
         markdown_content = f"行内公式: ${formula}$\n\n块级公式:\n$${formula}$$"
         